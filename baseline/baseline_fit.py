@@ -1,17 +1,22 @@
 # baseline_fit.py
 # comment out lines to read files in 3 parts or 1 part
-import pandas as pd
 import numpy as np
 from scipy.optimize import curve_fit
 import matplotlib.pyplot as plt
+from pathlib import Path
+import sys
 
-# load the parquet files from data_loader.py
-df = pd.concat([pd.read_parquet("dataset_part1.parquet"),pd.read_parquet("dataset_part2.parquet"),pd.read_parquet("dataset_part3.parquet")])
+sys.path.insert(0, str(Path(__file__).parent.parent / "code"))
+from dataset_io import load_dataset
+from binning import bin_stats, binned_curve
+from density_plot import density_scatter
 
-# Select S&P 500, T=5
-# data = df[(df["ticker"] == "^GSPC") & (df["T"] == 5)].copy()
-# data = df[(df["ticker"] == "^GSPC") ].copy()
-data = df.copy()
+# load the dataset from data_loader.py, reading only z and sigma; z_raw is de-meaned with the stored stats
+data = load_dataset(columns=["z", "sigma"])
+
+# Select S&P 500, T=5 (only the matching files and row groups are read)
+# data = load_dataset(columns=["z", "sigma"], filters=[("ticker", "==", "^GSPC"), ("T", "==", 5)])
+# data = load_dataset(columns=["z", "sigma"], filters=[("ticker", "==", "^GSPC")])
 data["var"] = data.sigma**2
 
 #print(f"S&P 500 T=5: {len(data)} windows")
@@ -26,11 +31,8 @@ nbins = int(2*zmax/delz + 1)
 #bins = np.linspace(-0.5, 0.5, 41)         # fixed bins
 bins = np.linspace(-zmax, zmax, nbins)         # fixed bins
 
-# create data frame with e.g. zbin = (-0.601, -0.55], z_mid, sigma
-binned = (data.assign(z_bin=pd.cut(data.z, bins=bins, include_lowest=True))
-               .groupby('z_bin',observed=False)
-               .agg(z_mid=('z', 'mean'), var=('var', 'mean'))
-               .dropna())
+# per-bin count and sums with bins like (-0.6, -0.55], then z_mid = mean z and var = mean variance per bin
+binned = binned_curve(**bin_stats(data.z.values, data["var"].values, bins))
 
 # zmid = (bins[0:(nbins-1)] + bins[1:(nbins)])/2
 
@@ -46,13 +48,8 @@ r2 = 1 - np.sum((binned["var"] - fitted)**2) / np.sum((binned["var"] - binned["v
 print(f"σ₀ = {popt[0]:.4f}  zoff = {popt[1]:.4f}  R² = {r2:.4f}")
 
 # plot of all stocks
-markfac = 1  # default is 1, can increase to 3 if less data points
 plt.figure(figsize=(9,7))
-plt.scatter(data.z, data['var'], c='steelblue', alpha=markfac*0.1, s=markfac*1, edgecolor='none')
-numeric_array = (1 - data["T"]/130)
-string_array = [str(x) for x in numeric_array]
-#plt.scatter(data.z, data['var'], c='steelblue', alpha=numeric_array, s=1, edgecolor='none')
-#plt.scatter(data.z, data['var'], c=string_array, alpha=0.1, s=1, edgecolor='none')
+density_scatter(plt.gca(), data.z, data['var'], (-zmax, zmax), (0.0, 0.35), color='steelblue')   # scale='linear' for a linear colour scale
 plt.plot(binned.z_mid, binned['var'], 'b-', lw=3)     # label='binned'
 plt.plot(binned.z_mid, fitted, 'red', lw=3, label=f'σ₀ = {popt[0]:.3f}, zoff = {popt[1]:.3f}, R² = {r2:.3f}')
 
@@ -0,0 +1,280 @@
+# run_benchmarks.py - throughput, latency and peak memory of the expensive stages
+# simulation (every model in code/models.py), the CSV round trip, windowing, the dataset write,
+# binning and scoring at 1e5, 1e6 and 5e6 days, plus data_loader.py and the scorer on synthetic
+# prices standing in for the 401-ticker yfinance benchmark. Results are written as JSON, and
+# --compare flags every stage that got slower or bigger than a saved baseline.
+#   python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json    # exit status 1 on a regression
+#   python benchmarks/run_benchmarks.py --sizes 1e5 1e6 --stages window score --no-full
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "code"))
+from binning import N_SEGMENTS
+from dataset_io import iter_csv_returns, load_dataset
+from instrument import enable, rss_mb, stage
+from models import CHUNK_DAYS, MODELS, simulate
+from pipeline import run_pipeline, write_price_csv
+from score_submission import frame_stats, read_dataset, score
+from windowing import HORIZONS, WindowStream
+
+SIZES = (100_000, 1_000_000, 5_000_000)
+STAGES = ("simulate", "csv_write", "csv_read", "window", "dataset", "read", "bin", "score", "score_sketch")
+SIM_MAX_DAYS = {"cir_poisson": 1_000_000}   # steps day by day in Python: 5e6 days take minutes
+REPEAT_DAYS = 3_000_000                     # repeat a stage while repeats * n_days stay below this
+FULL_TICKERS = 401                          # tickers in data_loader.py
+FULL_DAYS = (4_750, 19_000)                 # a quarter of the trading days since 1950, up to all of them
+TOLERANCE = 0.25
+
+
+# --- measurement --------------------------------------------------------------------------
+
+def measure(fn, repeat=1):
+    """
+    Run fn() `repeat` times. Returns fn's result and the wall time (best and
+    every run), CPU time and peak RSS of the best run, and the peak's rise
+    over the RSS the stage started from (delta_mb). Each run is an
+    instrument.py stage, so the stages inside fn do not hide its peak.
+    """
+    runs = []
+    for _ in range(repeat):
+        start_mb = rss_mb() or 0.0
+        with stage("benchmark") as rec:
+            out = fn()
+        delta = None if rec.peak_mb is None else max(rec.peak_mb - start_mb, 0.0)   # None: no peak on this platform
+        runs.append({"seconds": rec.wall, "cpu_seconds": rec.cpu, "peak_mb": rec.peak_mb, "delta_mb": delta})
+    best = min(runs, key=lambda r: r["seconds"])
+    return out, {**best, "runs": [r["seconds"] for r in runs]}
+
+
+def record(results, stage, n_days, stats, windows=None, verbose=True):
+    row = {"stage": stage, "n_days": int(n_days), **stats,
+           "days_per_s": n_days / stats["seconds"] if stats["seconds"] > 0 else None}
+    if windows is not None:
+        row["windows"] = int(windows)
+        row["windows_per_s"] = windows / stats["seconds"] if stats["seconds"] > 0 else None
+    results.append(row)
+    if verbose:
+        rate = f"{row['windows_per_s']:>12,.0f} windows/s" if windows is not None else f"{row['days_per_s']:>12,.0f} days/s"
+        if row["peak_mb"] is None:
+            memory = "peak      n/a"
+        else:
+            memory = f"peak {row['peak_mb']:8.1f} MB  (+{row['delta_mb']:.1f})"
+        print(f"{stage:26s} {n_days:>11,} days {row['seconds']:9.3f} s {rate}  {memory}", flush=True)
+    return row
+
+
+# --- benchmarks at one simulation length ---------------------------------------------------
+
+def _chunks(ret, size=CHUNK_DAYS):
+    return (ret[k:k + size] for k in range(0, len(ret), size))
+
+
+def bench_length(n_days, stages, models, repeat, tmp, seed=1, verbose=True):
+    """Every stage in `stages` on an n_days path of the regime mixture model (simulate: of every model)."""
+    results = []
+    reps = max(1, min(repeat, REPEAT_DAYS // n_days))
+
+    if "simulate" in stages:
+        for name in models:
+            if n_days > SIM_MAX_DAYS.get(name, np.inf):
+                continue
+            sum(len(r) for r in simulate(name, 1_000, seed))        # imports are not part of the stage
+            _, stats = measure(lambda: sum(len(r) for r in simulate(name, n_days, seed)), reps)
+            record(results, f"simulate/{name}", n_days, stats, verbose=verbose)
+
+    ret = np.concatenate(list(simulate("regime_mixture", n_days, seed)))     # input of the other stages
+    csv = Path(tmp) / "prices.csv"
+    dataset = Path(tmp) / "dataset.parquet"
+
+    if "csv_write" in stages or "csv_read" in stages:
+        log_prices = np.concatenate([[np.log(100.0)], np.log(100.0) + np.cumsum(ret)])
+        _, stats = measure(lambda: sum(1 for _ in write_price_csv(_chunks(log_prices), csv)), reps)
+        if "csv_write" in stages:
+            record(results, "csv_write", n_days, stats, verbose=verbose)
+        if "csv_read" in stages:
+            _, stats = measure(lambda: sum(len(r) for r in iter_csv_returns(csv)), reps)
+            record(results, "csv_read", n_days, stats, verbose=verbose)
+
+    if "window" in stages:
+        def window():
+            stream = WindowStream(HORIZONS)
+            return sum(len(stream.push(r)["T"]) for r in _chunks(ret))
+        nwin, stats = measure(window, reps)
+        record(results, "window", n_days, stats, nwin, verbose)
+
+    result, stats = measure(lambda: run_pipeline(_chunks(ret), HORIZONS, output=dataset), reps)
+    if "dataset" in stages:
+        record(results, "dataset", n_days, stats, result.nrows, verbose)
+
+    df, stats = measure(lambda: read_dataset([str(dataset)]), reps)
+    if "read" in stages:
+        record(results, "read", n_days, stats, len(df), verbose)
+    if "bin" in stages:
+        _, stats = measure(lambda: frame_stats(df, N_SEGMENTS), reps)
+        record(results, "bin", n_days, stats, len(df), verbose)
+    if "score" in stages:
+        _, stats = measure(lambda: score(str(dataset)), reps)
+        record(results, "score", n_days, stats, len(df), verbose)
+    if "score_sketch" in stages:
+        _, stats = measure(lambda: score(result.sketch), reps)
+        record(results, "score_sketch", n_days, stats, len(df), verbose)
+    return results
+
+
+# --- the benchmark dataset at full scale -----------------------------------------------------
+
+CHILD = """
+import json, runpy, sys
+from pathlib import Path
+sys.path.insert(0, %r)
+from instrument import enable, stage
+enable()
+peak_file, sys.argv = sys.argv[1], sys.argv[2:]
+with stage("benchmark") as rec:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+Path(peak_file).write_text(json.dumps(rec.peak_mb))
+""" % str(ROOT / "code")
+
+def synthetic_prices(directory, n_tickers=FULL_TICKERS, days=FULL_DAYS, seed=0):
+    """
+    Write <ticker>.parquet files of daily closes (inverse-gamma GBM, see
+    models.py) for data_loader.py --source, with histories of random length
+    ending on the same business day. Returns the total number of days.
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp("2025-12-03")
+    total = 0
+    for k, n in enumerate(rng.integers(days[0], days[1] + 1, n_tickers)):
+        ret = np.concatenate(list(simulate("ig_gbm", int(n) - 1, rng)))
+        close = 100.0 * np.exp(np.concatenate([[0.0], np.cumsum(ret)]))
+        dates = pd.bdate_range(end=end, periods=int(n))
+        pd.DataFrame({"Date": dates, "Close": close}).to_parquet(Path(directory) / f"T{k:03d}.parquet")
+        total += int(n)
+    return total
+
+
+def bench_full(tmp, n_tickers=FULL_TICKERS, verbose=True):
+    """data_loader.py on synthetic prices in a subprocess, then reading and scoring its store."""
+    results = []
+    prices, store = Path(tmp) / "prices", Path(tmp) / "dataset"
+    prices.mkdir(exist_ok=True)
+    n_days = synthetic_prices(prices, n_tickers)
+    tickers = sorted(p.stem for p in prices.glob("*.parquet"))
+
+    tickers_file = Path(tmp) / "tickers.txt"
+    tickers_file.write_text("\n".join(tickers))
+
+    # the child reports its own peak: the children's maxrss would count the pages it shared with us before exec
+    peak_file = Path(tmp) / "peak_mb"
+    cmd = [sys.executable, "-c", CHILD, str(peak_file),
+           str(ROOT / "data_loader.py"), "--tickers-file", str(tickers_file),
+           "--source", str(prices), "--cache", "", "--output", str(store)]
+    wall, cpu = time.perf_counter(), os.times()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, cwd=tmp)
+    after = os.times()      # children's CPU time (zero on Windows, which does not report it)
+    peak = json.loads(peak_file.read_text())
+    stats = {"seconds": time.perf_counter() - wall,
+             "cpu_seconds": (after.children_user + after.children_system) - (cpu.children_user + cpu.children_system),
+             "peak_mb": peak, "delta_mb": peak}
+    stats["runs"] = [stats["seconds"]]
+
+    df, read_stats = measure(lambda: load_dataset(store, columns=["ticker", "T", "sigma", "z"]))
+    record(results, "full/data_loader", n_days, stats, len(df), verbose)
+    record(results, "full/read", n_days, read_stats, len(df), verbose)
+    _, stats = measure(lambda: frame_stats(df, N_SEGMENTS))
+    record(results, "full/bin", n_days, stats, len(df), verbose)
+    _, stats = measure(lambda: score(df))
+    record(results, "full/score", n_days, stats, len(df), verbose)
+    return results
+
+
+# --- baselines -----------------------------------------------------------------------------
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"time": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count()}
+
+
+def compare(results, baseline, tolerance=TOLERANCE, min_seconds=0.05, min_mb=16.0):
+    """
+    Stages of `results` slower or using more memory than the same stage and
+    length in `baseline` by more than `tolerance` (a fraction). Differences
+    below min_seconds / min_mb are noise. Returns one row per common stage.
+    """
+    base = {(r["stage"], r["n_days"]): r for r in baseline["results"]}
+    rows = []
+    for r in results:
+        b = base.get((r["stage"], r["n_days"]))
+        if b is None:
+            continue
+        slower = r["seconds"] > b["seconds"] * (1 + tolerance) and r["seconds"] - b["seconds"] > min_seconds
+        bigger = (r["delta_mb"] is not None and b["delta_mb"] is not None
+                  and r["delta_mb"] > b["delta_mb"] * (1 + tolerance) and r["delta_mb"] - b["delta_mb"] > min_mb)
+        rows.append({"stage": r["stage"], "n_days": r["n_days"], "seconds": r["seconds"],
+                     "base_seconds": b["seconds"], "time_ratio": r["seconds"] / b["seconds"] if b["seconds"] > 0 else np.nan,
+                     "delta_mb": r["delta_mb"], "base_delta_mb": b["delta_mb"],
+                     "regression": ", ".join(k for k, bad in (("time", slower), ("memory", bigger)) if bad)})
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulators, loaders and scorer")
+    parser.add_argument("--sizes", type=lambda v: int(float(v)), nargs="*", default=list(SIZES),
+                        help="simulation lengths in days (default 1e5 1e6 5e6)")
+    parser.add_argument("--stages", nargs="*", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--models", nargs="*", choices=list(MODELS), default=list(MODELS),
+                        help="models timed by the simulate stage")
+    parser.add_argument("--no-full", action="store_true", help="skip data_loader.py on the synthetic benchmark")
+    parser.add_argument("--tickers", type=int, default=FULL_TICKERS, help="tickers of the synthetic benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage for short lengths, best is kept")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--save", metavar="JSON", help="also write the results as a baseline here")
+    parser.add_argument("--compare", metavar="JSON", help="baseline to check the results against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown (default %(default)s)")
+    args = parser.parse_args(argv)
+    enable()        # peak RSS per stage (instrument.py measures it only when asked)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            results += bench_length(n, args.stages, args.models, args.repeat, tmp)
+        if not args.no_full:
+            results += bench_full(tmp, args.tickers)
+
+    report = {"environment": environment(), "results": results}
+    for path in filter(None, (args.output, args.save)):
+        Path(path).write_text(json.dumps(report, indent=1))
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        table = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        with pd.option_context("display.width", 200):
+            print(table.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        bad = table[table.regression != ""] if len(table) else table
+        if len(bad):
+            print(f"{len(bad)} regression{'s' if len(bad) > 1 else ''} against {args.compare}")
+            sys.exit(1)
+        print(f"no regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
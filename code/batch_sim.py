@@ -0,0 +1,150 @@
+# batch_sim.py - many independent paths of the submitted simulators at once
+# the single-path simulators step one day at a time with scalar random draws in a Python loop; here
+# every day is one vectorized step over all paths, with the day's random numbers drawn in one block.
+# The recursions are the same operations in the same order, so each path follows the model exactly.
+#   prices = cir_poisson_paths(1000, 2500, seed=6)
+#   result = run_pipeline(path_returns(prices))        # see pipeline.py
+import numpy as np
+
+
+class CIRPoissonPaths:
+    """
+    Batched `simulate_price_series` of submissions/equityquant.dev: CIR-like
+    precision tau -> Poisson N -> Gaussian sqrt(N) returns, for `n_paths`
+    independent paths, produced a block of days at a time. Parameters as there.
+
+    Each day draws standard_normal(n_paths) for tau, poisson(lam) for N and
+    normals for the paths with N > 0 only, so n_paths=1 reproduces the
+    single-path prices bit for bit for the same seed, however the days are
+    split into chunks. The whole state (rng, tau, log-price) lives on the
+    object, so it can be pickled and resumed (see checkpoint.py).
+    """
+
+    def __init__(self, n_paths, n_days=300_000, s0=100.0, sigma0=0.25, c_int=10.0, kappa=0.50,
+                 seed=1, a_shape=1.5, lam_cap=500.0, burn_in=2000):
+        self.rng = np.random.default_rng(seed)
+        self.n_paths = n_paths
+        self.n_days = n_days
+        self.burn_in = burn_in
+        self.dt = 1.0 / 252.0
+        self.sqrt_dt = np.sqrt(self.dt)
+
+        # --- CIR stationary target for tau
+        a = a_shape
+        beta = sigma0**2
+        self.theta = a / beta
+        self.eta = np.sqrt(2.0 * kappa * self.theta / a)
+        self.kappa = kappa
+        self.c_int = c_int
+        self.lam_cap = lam_cap
+
+        # stationary-mean lambda, fixed mixture variance scale
+        lam_bar = max(min(lam_cap, c_int / self.theta), 1e-8)
+        self.s_unit = np.sqrt((sigma0**2 / 252.0) / lam_bar)
+
+        # start tau at stationary mean
+        self.tau = np.full(n_paths, self.theta)
+        self.logP = np.full(n_paths, np.log(s0))
+        self.t = 0                     # steps simulated, burn-in included
+        self.days_done = 0             # days returned; day j is the log-price after burn_in + j steps
+
+    def _step(self):
+        # --- fast-mixing tau step
+        tau_pos = np.maximum(self.tau, 0.0)
+        tau = (self.tau + self.kappa * (self.theta - tau_pos) * self.dt
+               + self.eta * np.sqrt(tau_pos) * self.rng.standard_normal(self.n_paths) * self.sqrt_dt)
+        self.tau = np.maximum(tau, 1e-10)
+
+        # --- Poisson intensity and Poisson–Gaussian mixture
+        lam = np.minimum(self.c_int / self.tau, self.lam_cap)
+        N = self.rng.poisson(lam)
+        jump = N > 0
+        r_t = np.zeros(self.n_paths)
+        r_t[jump] = self.s_unit * np.sqrt(N[jump]) * self.rng.standard_normal(jump.sum())
+        self.logP = self.logP + r_t
+        self.t += 1
+
+    def next_chunk(self, n_days):
+        """Log-prices of the next `n_days` days (fewer at the end), shape (n_paths, n)."""
+        n_days = max(min(n_days, self.n_days - self.days_done), 0)
+        out = np.empty((self.n_paths, n_days))
+        for j in range(n_days):
+            while self.t < self.burn_in + self.days_done:   # burn-in steps are simulated, not returned
+                self._step()
+            out[:, j] = self.logP
+            self.days_done += 1
+        return out
+
+    def next_log_prices(self, n_days):
+        """next_chunk of a single path, as a 1-D array (the interface checkpoint.py drives)."""
+        if self.n_paths != 1:
+            raise ValueError(f"next_log_prices gives one path, this simulator has {self.n_paths}; use next_chunk")
+        return self.next_chunk(n_days)[0]
+
+
+def cir_poisson_paths(n_paths, n_days=300_000, s0=100.0, sigma0=0.25, c_int=10.0, kappa=0.50,
+                      seed=1, a_shape=1.5, lam_cap=500.0, burn_in=2000):
+    """
+    Prices of `n_paths` CIR–Poisson paths at once, shape (n_paths, n_days);
+    see CIRPoissonPaths.
+    """
+    sim = CIRPoissonPaths(n_paths, n_days, s0, sigma0, c_int, kappa, seed, a_shape, lam_cap, burn_in)
+    return np.exp(sim.next_chunk(n_days))
+
+
+def garch_paths(beta, mu_annual, sigma_annual, num_samples=400, N=2500, S0=100, seed=42, v_max=None):
+    """
+    Batched `simulate_garch_raw` of submissions/tingjun2: GARCH(1,1) with
+    persistence alpha + beta = 0.99, variance targeted at sigma_annual, the
+    squared log return as shock and a price floor of 0.01.
+
+    v_max : clip the daily variance to [1e-9, v_max] before each step, as
+            the notebook's simulate_garch_vectorized does with (4**2)/252;
+            None leaves it unclipped, as simulate_garch_raw
+    Each day draws one block of num_samples normals from default_rng(seed),
+    so memory is O(num_samples) per step (the notebook's np.random.seed
+    stream is sample by sample, so the paths are not the same draws).
+
+    Returns
+    -------
+    prices, vols : ndarray, shape (num_samples, N)
+        Prices and annualised volatilities, one row per sample.
+    """
+    trading_days = 252
+    mu_daily = mu_annual / trading_days
+    alpha = 0.99 - beta
+    gamma = 1 - alpha - beta
+    target_V_daily = (sigma_annual**2) / trading_days
+    omega = target_V_daily * gamma
+
+    rng = np.random.default_rng(seed)
+    prices = np.empty((num_samples, N))
+    vols = np.empty((num_samples, N))
+    prices[:, 0] = S0
+    V = np.full(num_samples, target_V_daily)
+
+    for i in range(1, N):
+        if v_max is not None:
+            V = np.clip(V, 1e-9, v_max)
+        sigma_daily = np.sqrt(V)
+        vols[:, i-1] = sigma_daily * np.sqrt(trading_days)
+
+        log_return = mu_daily - 0.5 * V + sigma_daily * rng.standard_normal(num_samples)
+        prices[:, i] = np.maximum(prices[:, i-1] * np.exp(log_return), 0.01)
+        V = omega + alpha * log_return**2 + beta * V
+
+    # the last price has no subsequent volatility
+    vols[:, -1] = vols[:, -2]
+    return prices, vols
+
+
+def path_returns(prices):
+    """
+    Daily log returns of each path (rows of `prices`) in turn, with a NaN
+    between paths so that windowing.WindowStream rejects windows that would
+    straddle two independent paths. Feed to pipeline.run_pipeline.
+    """
+    prices = np.atleast_2d(prices)
+    for k, row in enumerate(prices):
+        ret = np.diff(np.log(row))
+        yield ret if k == 0 else np.concatenate([[np.nan], ret])
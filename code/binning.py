@@ -0,0 +1,132 @@
+# binning.py - per-bin counts and sums of z and variance with np.digitize / np.bincount
+# replaces pd.cut(...).groupby('z_bin').agg(...) in the scorer and baseline fit
+import numpy as np
+import pandas as pd
+
+N_SEGMENTS = 500   # model data (a single ticker) is divided into this many runs
+
+
+def bin_index(z, bins):
+    """
+    Bin number of each z for right-closed bins (bins[i], bins[i+1]] with the
+    lowest edge included, as pd.cut(z, bins, include_lowest=True). Values
+    outside the bins (and NaN) get -1.
+    """
+    z = np.asarray(z, dtype=float)
+    idx = np.digitize(z, bins, right=True) - 1
+    idx[z == bins[0]] = 0
+    idx[(idx < 0) | (idx >= len(bins) - 1)] = -1
+    return idx
+
+
+def group_codes(keys):
+    """Integer codes 0..n-1 and the sorted unique values of a key column."""
+    if isinstance(getattr(keys, "dtype", None), pd.CategoricalDtype):
+        # dictionary-encoded column: unique the small integer codes, not the strings
+        cat = pd.Categorical(keys)
+        used, codes = np.unique(cat.codes, return_inverse=True)
+        uniques = np.asarray(cat.categories)[used]
+        order = np.argsort(uniques)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return rank[codes], uniques[order]
+    uniques, codes = np.unique(np.asarray(keys), return_inverse=True)
+    return codes, uniques
+
+
+def key_codes(values, keys):
+    """Position of each value in `keys`, or -1 where it is not one of them."""
+    values = np.asarray(values)
+    keys = np.asarray(keys)
+    order = np.argsort(keys)
+    pos = np.searchsorted(keys[order], values).clip(0, len(keys) - 1)
+    return np.where(keys[order][pos] == values, order[pos], -1)
+
+
+# divide rows into equal segments, segment number is worked out from the row position
+# note that parquet file has ticker on outer loop so this is like selecting certain stocks
+def segment_codes(nr, N_SEGMENTS=N_SEGMENTS, start=0, stop=None):
+    """
+    Segment 0..N_SEGMENTS-1 of rows start..stop (default all nr rows) when nr rows
+    are cut into N_SEGMENTS equal runs; the nr % N_SEGMENTS extra rows at the end
+    get -1 and are dropped. Also returns one label 'V1', 'V2', ... per segment.
+    """
+    rows_per_segment = nr // N_SEGMENTS
+    pos = np.arange(start, nr if stop is None else stop, dtype=np.int64)
+    codes = np.full(len(pos), -1, dtype=np.int32)
+    if rows_per_segment > 0:
+        inside = pos < N_SEGMENTS * rows_per_segment
+        codes[inside] = pos[inside] // rows_per_segment
+
+    labels = np.array(['V' + str(i) for i in range(1, N_SEGMENTS + 1)])  # one name per segment, not per row
+    return codes, labels
+
+
+def bin_stats(z, var, bins, codes=(), sizes=()):
+    """
+    Count, sum of z and sum of variance per z bin, split by any number of
+    integer group keys, in one pass over the arrays.
+
+    codes : sequence of int arrays, one per key (e.g. ticker codes, T codes);
+            rows with a negative code are left out
+    sizes : number of groups for each key
+
+    Returns a dict of arrays shaped (*sizes, nbins). Coarser groupings are
+    sums over axes, e.g. the global curve of a (ticker, T) split is
+    stats["count"].sum(axis=(0, 1)).
+    """
+    nb = len(bins) - 1
+    idx = bin_index(z, bins)
+    keep = idx >= 0
+    for c in codes:
+        keep &= np.asarray(c) >= 0
+
+    flat = idx[keep].astype(np.int64)
+    stride = nb
+    for c, n in zip(reversed(codes), reversed(sizes)):
+        flat += np.asarray(c)[keep].astype(np.int64) * stride
+        stride *= n
+
+    shape = tuple(sizes) + (nb,)
+    return {
+        "count": np.bincount(flat, minlength=stride).reshape(shape),
+        "sum_z": np.bincount(flat, weights=np.asarray(z, dtype=float)[keep], minlength=stride).reshape(shape),
+        "sum_var": np.bincount(flat, weights=np.asarray(var, dtype=float)[keep], minlength=stride).reshape(shape),
+    }
+
+
+def binned_curve(count, sum_z, sum_var):
+    """
+    Mean z and mean variance of the non-empty bins of one group, the same
+    z_mid / var frame the pandas groupby produced (after .dropna()).
+    """
+    nz = count > 0
+    return pd.DataFrame({"z_mid": sum_z[nz] / count[nz], "var": sum_var[nz] / count[nz]},
+                        index=np.flatnonzero(nz))
+
+
+def histogram(z, edges, codes=None, size=None, density=False):
+    """
+    np.histogram counts ([a, b) bins, last bin closed) for z, optionally one
+    row per group (negative codes are left out). With density=True each row
+    integrates to one over the edges.
+    """
+    z = np.asarray(z, dtype=float)
+    nb = len(edges) - 1
+    idx = np.digitize(z, edges, right=False) - 1
+    idx[z == edges[-1]] = nb - 1
+    keep = (idx >= 0) & (idx < nb)
+    if codes is None:
+        counts = np.bincount(idx[keep], minlength=nb).astype(float)
+    else:
+        keep &= np.asarray(codes) >= 0
+        flat = np.asarray(codes)[keep].astype(np.int64) * nb + idx[keep]
+        counts = np.bincount(flat, minlength=size*nb).reshape(size, nb).astype(float)
+    return to_density(counts, edges) if density else counts
+
+
+def to_density(counts, edges):
+    """Histogram counts (one row per group) scaled so each row integrates to one over the edges."""
+    counts = np.asarray(counts, dtype=float)
+    total = counts.sum(axis=-1, keepdims=True)
+    return counts / np.where(total > 0, total, 1) / np.diff(edges)
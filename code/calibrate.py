@@ -0,0 +1,177 @@
+# calibrate.py - fit model parameters to the target q-variance parabola (σ₀ = 0.2586, zoff = 0.0214)
+# instead of rerunning 5e6-day simulations from a notebook (submissions/simu.ai/fine_tune_parameters.ipynb),
+# every candidate is simulated with the same seeds (common random numbers), so two candidates differ
+# by their parameters and not by their noise, and the Nelder–Mead search starts on short paths and
+# moves to longer ones only after it has converged at the current length.
+#   python code/calibrate.py regime_mixture --free sigma0=0.25 mu=0.02 --fixed daily=True
+#   result = calibrate("cir_poisson", {"sigma0": 0.25, "c_int": 10, "kappa": 0.5})
+import argparse
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from binning import binned_curve
+from fitting import fit_qvar
+from models import parse_params
+from pipeline import run_pipeline
+from score_submission import BINS, TARGET, qvar, r2_score
+from sketch import merge_sketches
+from sweep import simulate_returns
+from windowing import HORIZONS
+
+LENGTHS = (100_000, 400_000, 1_600_000, 5_000_000)   # days per path at each stage of the search
+OBJECTIVES = ("r2", "fit")
+
+
+def evaluate(model, params, n_days, seeds=(0,), stride=None, horizons=HORIZONS, target=TARGET):
+    """
+    Simulate `model` at `params` once per seed and score the pooled windows
+    against `target`: the R² of the binned curve (as score_submission.score)
+    and the parabola fitted freely to it (fit_sigma0, fit_zoff).
+    """
+    sketches = [run_pipeline([simulate_returns(model, params, seed, n_days)], horizons, stride).sketch
+                for seed in seeds]
+    stats = merge_sketches(sketches).bin_stats(BINS)
+    curve = binned_curve(stats["count"], stats["sum_z"], stats["sum_var"])
+    fit = fit_qvar(stats["count"][None], stats["sum_z"][None], stats["sum_var"][None])
+    return {"r2": r2_score(curve["var"], qvar(curve.z_mid, *target)),
+            "fit_sigma0": fit["s0"][0], "fit_zoff": fit["zoff"][0], "fit_r2": fit["r2"][0]}
+
+
+def loss(scores, objective="r2", target=TARGET):
+    """
+    What the search minimizes: 1 - R² against the target parabola ("r2"), or
+    the distance of the freely fitted σ₀ and zoff from the target in units of
+    the target σ₀ ("fit").
+    """
+    if objective == "r2":
+        return 1.0 - scores["r2"]
+    if objective == "fit":
+        return float(np.hypot(scores["fit_sigma0"] - target[0], scores["fit_zoff"] - target[1]) / target[0])
+    raise ValueError(f"objective must be one of {OBJECTIVES}, not {objective!r}")
+
+
+@dataclass
+class CalibrationResult:
+    """Best parameters found (free and fixed), their scores at the longest length and every evaluation."""
+    params: dict
+    loss: float
+    scores: dict
+    n_evals: int
+    seconds: float
+    history: pd.DataFrame = field(repr=False)
+
+
+def calibrate(model, start, fixed=None, step=0.1, bounds=None, lengths=LENGTHS, seeds=(0,),
+              objective="r2", target=TARGET, stride=None, xtol=0.05, max_evals=60, verbose=True):
+    """
+    Fit the parameters in `start` to the target parabola with Nelder–Mead,
+    one stage per length in `lengths`.
+
+    model    : registered model name (models.py), or a callable or
+               "file.py:function" string returning prices (see sweep.py)
+    start    : {name: initial value} of the free parameters
+    fixed    : other keyword arguments of the model, held constant
+    step     : initial search radius, per parameter ({name: step}) or as a
+               fraction of the start value (zero start values use it as is)
+    bounds   : {name: (low, high)} for any of the free parameters
+    seeds    : the common random numbers: every candidate runs on these seeds
+    xtol     : simplex size, in units of `step`, at which the last stage stops
+
+    Each stage starts from the best point of the one before with a simplex
+    half the size, and stops when the simplex has shrunk to a quarter of that
+    (the last stage: to `xtol`) or after `max_evals` evaluations. Early
+    stages are cheap, so most of the evaluations at the full length are
+    spent close to the optimum.
+    """
+    names = list(start)
+    x0 = np.array([float(start[n]) for n in names])
+    if isinstance(step, dict):
+        scale = np.array([float(step[n]) for n in names])
+    else:
+        scale = np.where(x0 != 0, np.abs(x0) * step, step)
+    bounds = bounds or {}
+    unit_bounds = [tuple(None if b is None else (b - x0[i]) / scale[i] for b in bounds.get(n, (None, None)))
+                   for i, n in enumerate(names)]
+    fixed = dict(fixed or {})
+
+    rows, cache = [], {}
+    started = time.perf_counter()
+
+    def params_of(u):
+        return {**fixed, **{n: float(v) for n, v in zip(names, x0 + scale * np.asarray(u))}}
+
+    def f(u, stage, n_days):
+        key = (n_days, tuple(np.round(u, 12)))
+        if key not in cache:
+            params = params_of(u)
+            t = time.perf_counter()
+            scores = evaluate(model, params, n_days, seeds, stride=stride, target=target)
+            cache[key] = loss(scores, objective, target)
+            rows.append({"stage": stage, "n_days": n_days, **{n: params[n] for n in names},
+                         "loss": cache[key], **scores, "seconds": time.perf_counter() - t})
+            if verbose:
+                print(f"  [{n_days:>9,}] " + "  ".join(f"{n}={params[n]:.6g}" for n in names)
+                      + f"  loss={cache[key]:.6f}  R²={scores['r2']:.4f}", flush=True)
+        return cache[key]
+
+    u = np.zeros(len(names))
+    for stage, n_days in enumerate(lengths):
+        radius = 0.5**stage
+        simplex = np.vstack([u, u + radius * np.eye(len(names))])
+        last = stage == len(lengths) - 1
+        res = minimize(f, u, args=(stage, n_days), method="Nelder-Mead",
+                       bounds=unit_bounds if bounds else None,
+                       options={"initial_simplex": simplex, "xatol": xtol if last else radius / 4,
+                                "fatol": np.inf, "maxfev": max_evals})
+        u = res.x
+        if verbose:
+            print(f"stage {stage}: {n_days:,} days, {res.nfev} evaluations, loss {res.fun:.6f}")
+
+    params = params_of(u)
+    history = pd.DataFrame(rows)
+    best = history[history.n_days == lengths[-1]].sort_values("loss").iloc[0]
+    scores = {k: best[k] for k in ("r2", "fit_sigma0", "fit_zoff", "fit_r2")}
+    return CalibrationResult(params, float(best["loss"]), scores, len(rows),
+                             time.perf_counter() - started, history)
+
+
+def _lengths(text):
+    return tuple(int(float(v)) for v in text.split(","))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate model parameters to the target q-variance parabola")
+    parser.add_argument("model", help='registered model name (models.py), or "file.py:function" returning prices')
+    parser.add_argument("--free", nargs="+", required=True, metavar="NAME=VALUE", help="parameters to fit and their start values")
+    parser.add_argument("--fixed", nargs="*", metavar="NAME=VALUE", help="parameters held fixed")
+    parser.add_argument("--bounds", nargs="*", metavar="NAME=LOW,HIGH", help="limits of free parameters")
+    parser.add_argument("--step", type=float, default=0.1, help="initial step as a fraction of the start values (default %(default)s)")
+    parser.add_argument("--lengths", type=_lengths, default=LENGTHS, help="days per stage, comma separated (default %(default)s)")
+    parser.add_argument("--seeds", type=int, nargs="*", default=[0], help="common random numbers (default %(default)s)")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="r2")
+    parser.add_argument("--max-evals", type=int, default=60, help="evaluations per stage (default %(default)s)")
+    parser.add_argument("--csv", help="write every evaluation to this CSV file")
+    args = parser.parse_args(argv)
+
+    result = calibrate(args.model, parse_params(args.free), parse_params(args.fixed), args.step,
+                       {k: tuple(v) for k, v in parse_params(args.bounds).items()},
+                       args.lengths, tuple(args.seeds), args.objective, max_evals=args.max_evals)
+    print()
+    print(f"{result.n_evals} evaluations in {result.seconds:.0f} s")
+    for name in parse_params(args.free):
+        print(f"  {name} = {result.params[name]:.6g}")
+    print(f"  R² = {result.scores['r2']:.4f}  fitted σ₀ = {result.scores['fit_sigma0']:.4f}"
+          f"  zoff = {result.scores['fit_zoff']:.4f}  (target {TARGET[0]}, {TARGET[1]})")
+    if args.csv:
+        result.history.to_csv(args.csv, index=False)
+
+
+if __name__ == "__main__":
+    main()
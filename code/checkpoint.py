@@ -0,0 +1,101 @@
+# checkpoint.py - run a very long simulation in chunks that survive the process being killed
+# every chunk of daily log-prices is appended to a directory as its own parquet file, and the
+# simulator itself (random generator state and latent state included) is pickled next to them
+# every few chunks. Running the same call again resumes from the last checkpoint, so a 1e8-day
+# job on a preemptible machine loses at most the chunks since then.
+#   make = lambda: RegimeMixtureSimulator(0.28, n_days=100_000_000, seed=1)   # or CIRPoissonPaths(1, ...)
+#   run_checkpointed(make, "run1")
+#   result = run_pipeline(log_returns(iter_output("run1")))                   # see pipeline.py
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHECKPOINT = "checkpoint.pkl"
+PART = "part-{:06d}.parquet"
+
+
+def _replace(tmp, path):
+    """Move a finished temporary file into place, so readers never see half a file."""
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def part_files(directory):
+    """Output chunks written so far, in order."""
+    return sorted(Path(directory).glob(PART.replace("{:06d}", "*")))
+
+
+def save_checkpoint(directory, sim, parts):
+    """Pickle the simulator together with the number of output chunks it has produced."""
+    path = Path(directory) / CHECKPOINT
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump({"sim": sim, "parts": parts}, f)
+    _replace(tmp, path)
+
+
+def load_checkpoint(directory):
+    """(simulator, number of chunks) from the last checkpoint, or None if there is none."""
+    path = Path(directory) / CHECKPOINT
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    return state["sim"], state["parts"]
+
+
+def run_checkpointed(make_sim, directory, chunk_days=1_000_000, every=1, verbose=True):
+    """
+    Simulate a path to the end, appending its daily log-prices to `directory`.
+
+    make_sim   : callable returning a fresh simulator, only called when
+                 `directory` holds no checkpoint. A simulator has `n_days`,
+                 `days_done` and next_log_prices(n) returning the next chunk
+                 (RegimeMixtureSimulator, batch_sim.CIRPoissonPaths).
+    chunk_days : days per output file
+    every      : chunks between checkpoints
+
+    Chunks written after the last checkpoint are deleted on resume and
+    simulated again from the saved state, so the output is the same path as
+    an uninterrupted run. Returns the finished simulator.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for tmp in directory.glob("*.tmp"):          # left by a kill in the middle of a write
+        tmp.unlink()
+
+    state = load_checkpoint(directory)
+    sim, parts = (make_sim(), 0) if state is None else state
+    for path in part_files(directory)[parts:]:
+        path.unlink()
+    if verbose and state is not None:
+        print(f"resuming at day {sim.days_done:,} of {sim.n_days:,}")
+
+    while sim.days_done < sim.n_days:
+        L = sim.next_log_prices(chunk_days)
+        path = directory / PART.format(parts)
+        tmp = path.with_suffix(".tmp")
+        pq.write_table(pa.table({"log_price": L}), tmp, compression="zstd")
+        _replace(tmp, path)
+        parts += 1
+        if parts % every == 0 or sim.days_done >= sim.n_days:
+            save_checkpoint(directory, sim, parts)
+            if verbose:
+                print(f"checkpoint at day {sim.days_done:,} of {sim.n_days:,}")
+    return sim
+
+
+def iter_output(directory):
+    """Yield the log-price chunks of a checkpointed run in order."""
+    for path in part_files(directory):
+        yield pq.read_table(path, columns=["log_price"]).column("log_price").to_numpy()
+
+
+def read_output(directory):
+    """The whole log-price path of a checkpointed run."""
+    return np.concatenate(list(iter_output(directory)))
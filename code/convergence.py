@@ -0,0 +1,171 @@
+# convergence.py - score against simulation length from a single simulation
+# the README asks for submissions that are robust to the simulation length. Instead of generating
+# and scoring a dataset for every length, simulate once at the longest length and stream the
+# windows through; each prefix length on a geometric ladder is scored as soon as the stream passes
+# it, so the whole R²-vs-length curve costs one simulation and about two scorings of the full run.
+#   python code/convergence.py variance_timeseries.csv --min-days 5000 --plot convergence.png
+#   table = convergence(sim.iter_returns(), ladder(5_000_000))          # from a simulator in-process
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from binning import N_SEGMENTS, segment_codes
+from dataset_io import CSV_CHUNKSIZE, iter_csv_returns
+from fitting import fit_qvar
+from score_submission import BINS, TARGET, TVEC, score
+from sketch import Sketch
+from windowing import HORIZONS, WindowStream
+
+
+def ladder(n_max, n_min=5_000, factor=2.0):
+    """Prefix lengths n_min, n_min*factor, ... up to and including n_max."""
+    n = [int(round(n_min * factor**k)) for k in range(int(np.log(n_max / n_min) / np.log(factor)) + 1)]
+    return sorted({k for k in n if k < n_max} | {int(n_max)})
+
+
+class PrefixScorer:
+    """
+    Scores every prefix on a ladder of lengths (in days of returns) of a
+    return series that arrives in chunks.
+
+    push() takes the next chunk of daily log returns; every ladder length
+    the series has reached is scored on the way and kept as one row of
+    `table()`. A prefix is de-meaned with its own per-T means, as the loader
+    would for a simulation of that length, so windows cannot be binned before
+    the prefix ends: z_raw and sigma² are kept per T (16 bytes a window) and
+    each prefix is sketched (sketch.py) and scored from its bins, the same
+    score as score() on the prefix dataset. With a geometric ladder the
+    scoring work adds up to about twice that of the full series.
+    """
+
+    def __init__(self, lengths, horizons=HORIZONS, stride=None, target=TARGET, n_segments=N_SEGMENTS):
+        self.pending = sorted(int(n) for n in lengths)
+        self.horizons = [int(T) for T in horizons]
+        self.stream = WindowStream(self.horizons, stride)
+        self.target = target
+        self.n_segments = n_segments
+        self.z_raw = {T: [] for T in self.horizons}
+        self.var = {T: [] for T in self.horizons}
+        self.days = 0
+        self.rows = []
+
+    def push(self, ret):
+        ret = np.asarray(ret, dtype=float)
+        self.days += len(ret)
+        cols = self.stream.push(ret)
+        # every window ending before self.days is out now, so ladder lengths up to here can be scored
+        while self.pending and self.pending[0] <= self.days:
+            n = self.pending.pop(0)
+            before = cols["end"] < n
+            self._add({k: v[before] for k, v in cols.items()})
+            cols = {k: v[~before] for k, v in cols.items()}
+            self.rows.append(self.snapshot(n))
+        self._add(cols)
+
+    def _add(self, cols):
+        T = cols["T"]
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(T)) + 1, [len(T)]]) if len(T) else [0]
+        for a, b in zip(bounds[:-1], bounds[1:]):     # chunks are grouped by T
+            self.z_raw[int(T[a])].append(cols["z_raw"][a:b])
+            self.var[int(T[a])].append(cols["sigma"][a:b]**2)
+
+    def sketch(self):
+        """Sketch of the windows so far, de-meaned per T and ordered by T as the loader writes them."""
+        z, var, T = [], [], []
+        for Tcur in self.horizons:
+            if not self.z_raw[Tcur]:
+                continue
+            zr = self.z_raw[Tcur] = [np.concatenate(self.z_raw[Tcur])]    # one array per T from now on
+            self.var[Tcur] = [np.concatenate(self.var[Tcur])]
+            z.append(zr[0] - zr[0].mean())                                # the official de-meaning step
+            var.append(self.var[Tcur][0])
+            T.append(np.full(len(zr[0]), Tcur))
+        z, var, T = (np.concatenate(c) if c else np.zeros(0) for c in (z, var, T))
+        codes, groups = segment_codes(len(z), self.n_segments)
+        return Sketch.from_arrays(z, var, T, codes, groups, segmented=True)
+
+    def snapshot(self, n_days):
+        """Scores of the windows accumulated so far, labelled with n_days."""
+        sketch = self.sketch()
+        row = {"n_days": n_days, "n_windows": sketch.n_windows}
+        try:
+            report = score(sketch, target=self.target)
+        except (RuntimeError, ValueError):     # too few windows for the distribution fit
+            return row
+        stats = sketch.bin_stats(BINS)
+        fit = fit_qvar(stats["count"][None], stats["sum_z"][None], stats["sum_var"][None])
+        row.update({
+            "r2": report.r2,
+            "fit_sigma0": fit["s0"][0], "fit_zoff": fit["zoff"][0], "fit_r2": fit["r2"][0],   # free parabola
+            **{f"r2_T{T}": r2 for T, r2 in report.r2_by_T.items()},
+            "group_r2_mean": report.group_r2_mean, "group_r2_median": report.group_r2_median,
+            "dist_sigma0": report.dist_sigma0, "dist_r2": report.dist_r2,
+        })
+        return row
+
+    def table(self):
+        return pd.DataFrame(self.rows)
+
+
+def convergence(returns, lengths, horizons=HORIZONS, stride=None, target=TARGET):
+    """
+    Score every prefix length in `lengths` (days) of a return series given as
+    an iterable of chunks; returns one row per length, see PrefixScorer.
+    Lengths beyond the end of the series are scored at the end.
+    """
+    scorer = PrefixScorer(lengths, horizons, stride, target)
+    for ret in returns:
+        scorer.push(ret)
+    if scorer.pending:
+        scorer.rows.append(scorer.snapshot(scorer.days))
+    return scorer.table()
+
+
+def plot_convergence(table, path=None):
+    """R² (and R² per period) against the number of days, on a log axis."""
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(9, 6))
+    ax.plot(table.n_days, table.r2, 'o-', color='teal', lw=2, label='R² (all T)')
+    for Tcur in TVEC:
+        if f"r2_T{Tcur}" in table:
+            ax.plot(table.n_days, table[f"r2_T{Tcur}"], '-', c=str(Tcur/100), lw=1, label=f'T = {Tcur/5:.0f}')
+    ax.axhline(y=0.995, color='orange', linestyle='--', lw=2, label='0.995')
+    ax.set_xscale('log')
+    ax.set_xlabel('Simulation length (days)', fontsize=12)
+    ax.set_ylabel('R² against the target parabola', fontsize=12)
+    ax.grid(alpha=0.3)
+    ax.legend(fontsize=10)
+    if path is not None:
+        fig.savefig(path, dpi=150, bbox_inches='tight')
+    return fig
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score every prefix length of a simulated price series in one pass")
+    parser.add_argument("csv", nargs="?", default="variance_timeseries.csv", help="CSV file with a 'Price' column")
+    parser.add_argument("--min-days", type=int, default=5_000, help="shortest prefix (default %(default)s)")
+    parser.add_argument("--factor", type=float, default=2.0, help="ratio between prefix lengths (default %(default)s)")
+    parser.add_argument("--stride", type=int, default=None, help="days between window starts (default: T)")
+    parser.add_argument("--chunksize", type=int, default=CSV_CHUNKSIZE, help="prices read from the CSV at a time")
+    parser.add_argument("--csv-out", help="write the table to this CSV file")
+    parser.add_argument("--plot", metavar="PNG", help="save R² against length to this image")
+    args = parser.parse_args(argv)
+
+    lengths = ladder(10**12, args.min_days, args.factor)     # the full length is scored when the file ends
+    table = convergence(iter_csv_returns(args.csv, args.chunksize), lengths, stride=args.stride)
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if args.csv_out:
+        table.to_csv(args.csv_out, index=False)
+    if args.plot:
+        import matplotlib
+        matplotlib.use("Agg")
+        plot_convergence(table, args.plot)
+
+
+if __name__ == "__main__":
+    main()
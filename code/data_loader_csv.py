@@ -1,71 +1,56 @@
 # data_loader.py  reads in a CSV file, calculates variance over windows, and saves to parquet
 # reads prices from a column called "Price"
-import yfinance as yf
-import pandas as pd
 import numpy as np
 from pathlib import Path
+import argparse
+import sys
 
-HORIZONS = 5*(np.arange(26)+1)   # does 1 to 26 weeks, can also do [5, 10, 20, 40, 80, 160]
-
-all_data = []
-TICKERS = ["Model"]
-for ticker in TICKERS:
-    df = pd.read_csv("variance_timeseries.csv")
-    price = df["Price"]
-    
-    ret = np.log(price).diff().dropna().values
-
-    rows = []
-    scale = np.sqrt(252)
-
-    for T in HORIZONS:
-        i = 0
-        while i + T <= len(ret):
-            window = ret[i:i+T]     # T points
-            if len(window) < T * 0.8:
-                break
-
-            x = window.sum()   # total price change over the period
-            sigma = np.std(window, ddof=0) * scale  # use np.std to get std over period, ddof=1 means divisor is N-1
-            z_raw = x / np.sqrt(T / 252.0)
-
-            # REJECT BAD WINDOWS
-            if not (np.isfinite(sigma) and sigma > 0 and np.isfinite(z_raw)):
-                i += T
-                continue
-
-            rows.append({          # append row of data for this period
-                "ticker": ticker,
-                "date": price.index[i + T - 1],   # row number
-                "T": T,
-                "z_raw": float(z_raw),
-                "sigma": float(sigma)
-            })
-            i += T
-
-    if not rows:
-        print(" [no data]")
-        continue
+sys.path.insert(0, str(Path(__file__).parent))
+from dataset_io import iter_csv_returns, ROW_GROUP_SIZE, CSV_CHUNKSIZE
+from pipeline import run_pipeline
+from models import CHUNK_DAYS, parse_params, simulate
 
-    df = pd.DataFrame(rows)
-
-    # CLEAN BEFORE DE-MEANING 
-    df = df[np.isfinite(df['z_raw']) & np.isfinite(df['sigma']) & (df['sigma'] > 0)]
-
-    # NOW de-mean safely, this step groups by ticker and T, and subtracts the group mean 
-    df["z"] = df.groupby(["ticker", "T"])["z_raw"].transform(lambda g: g - g.mean())
-
-    df = df.drop(columns="z_raw")
-    df = df.dropna().reset_index(drop=True)  # Final clean
-
-    print(f" → {len(df)} clean windows")
-    all_data.append(df)
-
-full = pd.concat(all_data, ignore_index=True)
-
-
-n = len(full) // 3
+HORIZONS = 5*(np.arange(26)+1)   # does 1 to 26 weeks, can also do [5, 10, 20, 40, 80, 160]
 
-# Save to file
-full.to_parquet("dataset.parquet", compression=None)
-print("Done! 1 file created")
+parser = argparse.ArgumentParser(description="Compute q-variance windows from a CSV of model prices")
+parser.add_argument("csv", nargs="?", default="variance_timeseries.csv", help="CSV file with a 'Price' column")
+parser.add_argument("-o", "--output", default="dataset.parquet")
+parser.add_argument("--stride", type=int, default=None,
+                    help="days between window starts (default: T, i.e. non-overlapping windows)")
+parser.add_argument("--overlap", action="store_true", help="every sliding window, same as --stride 1")
+parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE, help="rows per parquet row group")
+parser.add_argument("--chunksize", type=int, default=CSV_CHUNKSIZE, help="prices read from the CSV at a time")
+parser.add_argument("--float32", action="store_true",
+                    help="store z and sigma as float32, about half the size (check the score with float32_check.py)")
+parser.add_argument("--sketch", metavar="PATH",
+                    help="also write a q-variance sketch (binned sums, see sketch.py) that score_submission.py can score")
+parser.add_argument("--sketch-only", action="store_true", help="write only the sketch, no window rows")
+parser.add_argument("--model", help="simulate this registered model (see models.py --list) instead of reading the CSV")
+parser.add_argument("--param", nargs="*", metavar="NAME=VALUE", help="parameters of --model")
+parser.add_argument("--n-days", type=lambda v: int(float(v)), default=1_000_000, help="days simulated with --model")
+parser.add_argument("--seed", type=int, default=None, help="seed of --model")
+args = parser.parse_args()
+if args.sketch_only and not args.sketch:
+    parser.error("--sketch-only needs --sketch PATH")
+stride = 1 if args.overlap else args.stride
+
+# The CSV is read in chunks and every window is emitted as soon as the chunk holding its last
+# day arrives, with partial windows carried across chunk boundaries. Windows are spilled per T
+# to temporary files and written out at the end, de-meaned and ordered by T as before, so peak
+# memory depends on the chunk and row group sizes and not on the length of the simulation.
+# A model that runs in-process can skip the CSV and feed its chunks to run_pipeline directly.
+if args.model:
+    returns = simulate(args.model, args.n_days, args.seed, CHUNK_DAYS, **parse_params(args.param))
+else:
+    returns = iter_csv_returns(args.csv, args.chunksize)
+result = run_pipeline(returns, HORIZONS, stride,
+                      output=None if args.sketch_only else args.output, sketch=bool(args.sketch),
+                      float32=args.float32, ticker="Model", row_group_size=args.row_group_size)
+nrows = result.nrows
+if nrows == 0:
+    print(" [no data]")
+print(f" → {nrows} clean windows")
+if result.sketch is not None:
+    result.sketch.write(args.sketch)
+nfiles = (not args.sketch_only) + (result.sketch is not None)
+print(f"Done! {nfiles} file{'s' if nfiles > 1 else ''} created")
@@ -0,0 +1,307 @@
+# dataset_io.py - read prices and write window datasets to parquet without holding them in memory
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from instrument import traced
+
+ROW_GROUP_SIZE = 1_000_000   # rows per parquet row group in the final dataset
+SPILL_ROWS = 65_536          # rows buffered per T before spilling to a temporary file
+CSV_CHUNKSIZE = 1_000_000    # prices read from the CSV at a time
+
+# compact columns: ticker is stored once per row group as a dictionary, T fits in int16 and the
+# model "date" is the row number of the window's last day. z and sigma can opt in to float32,
+# see code/float32_check.py for what that does to the score.
+TICKER = pa.dictionary(pa.int16(), pa.string())
+
+
+def dataset_schema(float32=False):
+    """Schema of a model dataset written by data_loader_csv.py."""
+    real = pa.float32() if float32 else pa.float64()
+    return pa.schema([
+        ("ticker", TICKER),
+        ("date", pa.int32()),
+        ("T", pa.int16()),
+        ("sigma", real),
+        ("z", real),
+    ])
+
+
+SCHEMA = dataset_schema()
+
+# benchmark store (see below): real dates, and z_raw until it is de-meaned at read time
+STORE_SCHEMA = pa.schema([
+    ("ticker", TICKER),
+    ("date", pa.date32()),
+    ("T", pa.int16()),
+    ("z_raw", pa.float64()),
+    ("sigma", pa.float64()),
+])
+
+SPILL_SCHEMA = pa.schema([
+    ("date", pa.int64()),
+    ("z_raw", pa.float64()),
+    ("sigma", pa.float64()),
+])
+
+
+def iter_csv_returns(path, chunksize=CSV_CHUNKSIZE, column="Price"):
+    """
+    Yield daily log returns from a CSV price column, `chunksize` prices at a
+    time. Same values as np.log(price).diff().dropna() on the whole column.
+    """
+    last = None
+    for chunk in traced("csv_read", pd.read_csv(path, usecols=[column], chunksize=chunksize)):
+        logp = np.log(chunk[column].to_numpy(dtype=float))
+        ret = np.diff(logp) if last is None else np.diff(np.concatenate([[last], logp]))
+        if len(logp):
+            last = logp[-1]
+        yield ret[~np.isnan(ret)]
+
+
+class WindowSpill:
+    """
+    Collects window chunks (as produced by windowing.WindowStream) in
+    per-T temporary parquet files, keeping the count and sum of z_raw for
+    each T. write() then streams them into one dataset ordered by T, as the
+    in-memory loaders produce, subtracting the per-T mean on the way.
+    Memory is bounded by SPILL_ROWS per T plus one output row group.
+    """
+
+    def __init__(self, horizons, spill_rows=SPILL_ROWS, tmpdir=None):
+        self.horizons = [int(T) for T in horizons]
+        self.spill_rows = spill_rows
+        self.tmp = tempfile.TemporaryDirectory(dir=tmpdir)
+        self.buffers = {T: [] for T in self.horizons}
+        self.nbuf = {T: 0 for T in self.horizons}
+        self.writers = {}
+        self.count = {T: 0 for T in self.horizons}
+        self.total = {T: 0.0 for T in self.horizons}
+
+    def add(self, cols):
+        T = cols["T"]
+        if len(T) == 0:
+            return
+        # chunks are grouped by T, so split at the change points
+        bounds = np.concatenate([[0], np.flatnonzero(np.diff(T)) + 1, [len(T)]])
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            Tcur = int(T[a])
+            part = {"date": cols["end"][a:b], "z_raw": cols["z_raw"][a:b], "sigma": cols["sigma"][a:b]}
+            self.count[Tcur] += b - a
+            self.total[Tcur] += part["z_raw"].sum()
+            self.buffers[Tcur].append(part)
+            self.nbuf[Tcur] += b - a
+            if self.nbuf[Tcur] >= self.spill_rows:
+                self._spill(Tcur)
+
+    def _spill(self, T):
+        if self.nbuf[T] == 0:
+            return
+        table = pa.table({k: np.concatenate([p[k] for p in self.buffers[T]]) for k in SPILL_SCHEMA.names},
+                         schema=SPILL_SCHEMA)
+        if T not in self.writers:
+            self.writers[T] = pq.ParquetWriter(Path(self.tmp.name) / f"T{T}.parquet", SPILL_SCHEMA,
+                                                 use_dictionary=False)   # dictionary pages on floats only grow memory
+        self.writers[T].write_table(table)
+        self.buffers[T] = []
+        self.nbuf[T] = 0
+
+    def means(self):
+        """Mean of z_raw per T, the official de-meaning step."""
+        return {T: self.total[T] / self.count[T] for T in self.horizons if self.count[T] > 0}
+
+    def nrows(self):
+        return sum(self.count.values())
+
+    def write(self, path, ticker, row_group_size=ROW_GROUP_SIZE, float32=False, sketch=None):
+        """
+        Write the dataset (ticker, date, T, sigma, z) to `path`; returns the number of rows.
+        float32=True stores z and sigma in single precision (z is de-meaned in double first).
+        `sketch` (a sketch.SketchBuilder) is fed the rows as written; with path=None
+        only the sketch is made.
+        """
+        for T in self.horizons:
+            self._spill(T)
+        for w in self.writers.values():
+            w.close()
+
+        means = self.means()
+        schema = dataset_schema(float32)
+        real = np.float32 if float32 else np.float64
+        nrows = 0
+        pending, npending = [], 0
+        writer = None if path is None else pq.ParquetWriter(path, schema, compression="none", use_dictionary=["ticker"])
+        try:
+            for T in self.horizons:
+                if T not in self.writers:
+                    continue
+                spill = pq.ParquetFile(Path(self.tmp.name) / f"T{T}.parquet")
+                for batch in spill.iter_batches(batch_size=row_group_size):
+                    n = batch.num_rows
+                    sigma = batch.column("sigma").to_numpy().astype(real)
+                    z = (batch.column("z_raw").to_numpy() - means[T]).astype(real)
+                    if sketch is not None:
+                        sketch.add(z, sigma.astype(float)**2, np.full(n, T))
+                    nrows += n
+                    if writer is None:
+                        continue
+                    pending.append(pa.table({
+                        "ticker": pa.DictionaryArray.from_arrays(np.zeros(n, dtype=np.int16), [ticker]),
+                        "date": batch.column("date").cast(pa.int32()),
+                        "T": pa.array(np.full(n, T, dtype=np.int16)),
+                        "sigma": pa.array(sigma),
+                        "z": pa.array(z),
+                    }, schema=schema))
+                    npending += n
+                    if npending >= row_group_size:
+                        writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+                        pending, npending = [], 0
+            if pending:
+                writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+        finally:
+            if writer is not None:
+                writer.close()
+        self.tmp.cleanup()
+        return nrows
+
+
+# --- deferred de-meaning -------------------------------------------------------------
+# The benchmark stores z_raw, and z = z_raw - mean(z_raw) per (ticker, T) is applied when the
+# data is read. The means come from a small stats table of counts and sums, so appending new
+# windows only writes the new rows and updates that table instead of rebuilding every file.
+
+STATS_FILE = "dataset_stats.parquet"
+
+
+def window_sums(df):
+    """Sufficient statistics per (ticker, T): window count, sum of z_raw and last window date."""
+    return (df.groupby(["ticker", "T"], observed=True)
+              .agg(count=("z_raw", "size"), sum=("z_raw", "sum"), last=("date", "max"))
+              .reset_index())
+
+
+def merge_sums(old, new):
+    """Combine two stats tables, e.g. the stored one and that of freshly appended windows."""
+    both = pd.concat([old, new], ignore_index=True)
+    return (both.groupby(["ticker", "T"], observed=True)
+                .agg(count=("count", "sum"), sum=("sum", "sum"), last=("last", "max"))
+                .reset_index())
+
+
+def group_means(table, stats):
+    """Mean z_raw of the (ticker, T) group of every row of an arrow table, from the stats table."""
+    ticker = table.unify_dictionaries().column("ticker").combine_chunks()   # one dictionary for all files
+    if not pa.types.is_dictionary(ticker.type):
+        ticker = ticker.dictionary_encode()
+    names = ticker.dictionary.to_pylist()
+    Ts = np.unique(stats["T"].to_numpy())
+
+    # (ticker, T) lookup grid: rows follow the dictionary of this table, columns the T values
+    grid = np.full((len(names), len(Ts)), np.nan)
+    rows = pd.Index(names).get_indexer(stats["ticker"])
+    cols = np.searchsorted(Ts, stats["T"].to_numpy())
+    hit = rows >= 0
+    grid[rows[hit], cols[hit]] = (stats["sum"] / stats["count"]).to_numpy()[hit]
+
+    T = table.column("T").to_numpy()
+    Tcol = np.searchsorted(Ts, T).clip(0, len(Ts) - 1)
+    mean = grid[ticker.indices.to_numpy(zero_copy_only=False), Tcol]
+    return np.where(Ts[Tcol] == T, mean, np.nan)
+
+
+# --- partitioned store -----------------------------------------------------------------
+# data_loader.py writes the benchmark as <DATASET_DIR>/T=<T>/<name>-<i>.parquet: one directory per
+# period, zstd-compressed, ticker dictionary-encoded and row groups small enough that their min/max
+# statistics let readers skip most of a file. The stats table sits next to it as _stats.parquet
+# (names starting with _ are not part of the dataset).
+
+DATASET_DIR = "dataset"
+PART_ROW_GROUP = 131_072     # rows per row group in the partitioned store
+PARTITIONING = ds.partitioning(pa.schema([("T", pa.int16())]), flavor="hive")
+
+
+def write_partitioned(df, root=DATASET_DIR, name="part0", row_group_size=PART_ROW_GROUP, replace=True):
+    """
+    Write windows (ticker, date, T, z_raw, sigma) into the partitioned store.
+
+    replace=True deletes the existing files of the periods being written (a
+    rebuild); replace=False adds `name` files next to them (an update), so
+    `name` must not be used already.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False).select(STORE_SCHEMA.names).cast(STORE_SCHEMA)
+    options = ds.ParquetFileFormat().make_write_options(
+        compression="zstd", use_dictionary=["ticker"], write_statistics=True)
+    ds.write_dataset(table, root, format="parquet", partitioning=PARTITIONING, file_options=options,
+                     basename_template=f"{name}-{{i}}.parquet",
+                     max_rows_per_group=row_group_size, min_rows_per_group=row_group_size,
+                     existing_data_behavior="delete_matching" if replace else "overwrite_or_ignore")
+
+
+def read_windows(source=DATASET_DIR, columns=None, filters=None, stats=None):
+    """
+    Read part of a window dataset, touching only the bytes it needs.
+
+    source  : the partitioned store directory, or a list of parquet files
+    columns : output columns out of ticker, date, T, sigma, z (default all stored)
+    filters : pyarrow expression or pd.read_parquet style list of tuples,
+              e.g. [("T", "==", 5)] reads one directory of the store and
+              [("ticker", "in", ["MMM"])] skips row groups via statistics
+    stats   : stats table (DataFrame or path) for data stored as z_raw,
+              default <source>/_stats.parquet
+
+    Asking for z from a z_raw dataset also reads ticker (dictionary encoded,
+    so cheap) and T to look up the per-group mean. The result is a single
+    DataFrame built straight from the arrow table, with no concatenation.
+    """
+    is_dir = isinstance(source, (str, Path)) and Path(source).is_dir()
+    dataset = ds.dataset(str(source) if is_dir else [str(p) for p in source], format="parquet",
+                         partitioning=PARTITIONING if is_dir else None)
+    if isinstance(filters, list):
+        filters = pq.filters_to_expression(filters)
+
+    stored = dataset.schema.names
+    if columns:
+        want = list(columns)
+    else:   # everything stored, in the usual column order
+        avail = [c if c != "z_raw" else "z" for c in stored]
+        usual = ["ticker", "date", "T", "sigma", "z"]
+        want = [c for c in usual if c in avail] + [c for c in avail if c not in usual]
+    raw = "z" in want and "z" not in stored and "z_raw" in stored
+    read = [c for c in want if c in stored]
+    if raw:
+        read += [c for c in ("ticker", "T", "z_raw") if c not in read]
+    table = dataset.to_table(columns=read, filter=filters)
+
+    if raw:
+        if stats is None:
+            stats = Path(source) / "_stats.parquet" if is_dir else STATS_FILE
+        if not isinstance(stats, pd.DataFrame):
+            stats = pd.read_parquet(stats)
+        z = table.column("z_raw").to_numpy() - group_means(table, stats)
+        table = table.append_column("z", pa.array(z))
+    return table.select(want).to_pandas(date_as_object=False)   # ticker comes back categorical, dates as datetime64
+
+
+def load_dataset(paths=None, stats=None, columns=None, filters=None):
+    """
+    Read dataset parquet file(s) as one DataFrame with columns ticker, date, T, sigma, z.
+    Defaults to the partitioned store in DATASET_DIR, else the benchmark parts.
+    A directory is read as a partitioned store. Files that already hold z (such as
+    submissions) are returned as stored; data holding z_raw is de-meaned with
+    the stats table. `columns` and `filters` are passed to read_windows.
+    """
+    if paths is None:
+        if Path(DATASET_DIR).is_dir():
+            paths = DATASET_DIR
+        else:
+            paths = sorted(Path(".").glob("dataset_part*.parquet"), key=lambda p: (len(p.name), p.name))
+    if isinstance(paths, (list, tuple)) and len(paths) == 1:
+        paths = paths[0]
+    if isinstance(paths, (str, Path)) and not Path(paths).is_dir():
+        paths = [paths]
+    return read_windows(paths, columns, filters, stats)
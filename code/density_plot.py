@@ -0,0 +1,59 @@
+# density_plot.py - draw millions of (z, variance) points as one image instead of one marker each
+# the points are counted on a pixel grid with np.bincount and shown with imshow, so drawing and
+# saving cost depends on the number of pixels, not the number of windows
+import numpy as np
+import matplotlib.colors as mcolors
+
+
+def density_grid(x, y, xlim, ylim, shape):
+    """
+    Number of points in each cell of a regular grid over xlim x ylim.
+
+    shape : (ny, nx) cells. Points outside the limits (and NaN) are left out.
+    Returns an int array shaped (ny, nx), row 0 at ylim[0], the same counts
+    as np.histogram2d(y, x, ...) with uniform bins, in one bincount pass.
+    """
+    ny, nx = shape
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    fx = (x - xlim[0]) / (xlim[1] - xlim[0]) * nx
+    fy = (y - ylim[0]) / (ylim[1] - ylim[0]) * ny
+    keep = (fx >= 0) & (fx <= nx) & (fy >= 0) & (fy <= ny)   # NaN fails every comparison
+    ix = np.minimum(fx[keep].astype(np.int64), nx - 1)      # right edge goes in the last cell
+    iy = np.minimum(fy[keep].astype(np.int64), ny - 1)
+    return np.bincount(iy*nx + ix, minlength=ny*nx).reshape(ny, nx)
+
+
+def density_scatter(ax, x, y, xlim, ylim, color='steelblue', scale='log', shape=None, **kwargs):
+    """
+    Drop-in for ax.scatter(x, y, ...) on very many points: a density image of
+    the points over xlim x ylim, a faint tint of `color` where sparse and
+    full `color` where dense.
+
+    scale : 'log' or 'linear' colour scaling of the counts; log keeps the
+            sparse tails visible as the small, faint markers of a scatter did
+    shape : (ny, nx) grid, default one cell per pixel of the axes
+    kwargs are passed on to imshow. Empty cells are transparent, so the grid
+    and anything drawn underneath still show. Returns the AxesImage.
+    """
+    if shape is None:
+        fig = ax.figure
+        bbox = ax.get_window_extent().transformed(fig.dpi_scale_trans.inverted())
+        shape = (max(int(bbox.height*fig.dpi), 1), max(int(bbox.width*fig.dpi), 1))
+
+    counts = density_grid(x, y, xlim, ylim, shape)
+    image = np.ma.masked_equal(counts, 0)
+    vmax = max(counts.max(), 2)
+    if scale == 'log':
+        norm = mcolors.LogNorm(vmin=1, vmax=vmax)
+    elif scale == 'linear':
+        norm = mcolors.Normalize(vmin=0, vmax=vmax)
+    else:
+        raise ValueError(f"scale must be 'log' or 'linear', not {scale!r}")
+    rgb = np.array(mcolors.to_rgb(color))
+    cmap = mcolors.LinearSegmentedColormap.from_list('density', [0.85 + 0.15*rgb, rgb])   # faint tint for a single point
+
+    kwargs.setdefault('zorder', 0)
+    im = ax.imshow(image, origin='lower', extent=(xlim[0], xlim[1], ylim[0], ylim[1]),
+                   aspect='auto', interpolation='nearest', cmap=cmap, norm=norm, **kwargs)
+    return im
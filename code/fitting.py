@@ -0,0 +1,76 @@
+# fitting.py - closed-form least-squares fits of the q-variance parabola to binned curves
+# qvar(z, s0, zoff) = s0^2 + (z - zoff)^2/2 and qvar2(z, s0, s1) = s0^2 + s1*z^2 are both linear
+# after a change of variables, so every ticker/segment is solved at once from the bin statistics
+import numpy as np
+
+
+def _curves(count, sum_z, sum_var):
+    """Bin means x = mean z, y = mean var and a mask of non-empty bins, all shaped (..., nbins)."""
+    count = np.asarray(count, dtype=float)
+    nz = count > 0
+    safe = np.where(nz, count, 1.0)
+    x = np.where(nz, np.asarray(sum_z) / safe, 0.0)
+    y = np.where(nz, np.asarray(sum_var) / safe, 0.0)
+    return x, y, nz
+
+
+def _linear_fit(u, y, w):
+    """Least-squares y = a + b*u over the points with w == 1, along the last axis."""
+    n = w.sum(-1)
+    su, sy = (w*u).sum(-1), (w*y).sum(-1)
+    suu, suy = (w*u*u).sum(-1), (w*u*y).sum(-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        b = (n*suy - su*sy) / (n*suu - su*su)
+        a = (sy - b*su) / n
+    return a, b
+
+
+def r_squared(y, fitted, w):
+    """1 - SS_res/SS_tot over the points with w == 1, along the last axis."""
+    n = w.sum(-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ybar = (w*y).sum(-1, keepdims=True) / n
+        return 1 - (w*(y - fitted)**2).sum(-1) / (w*(y - ybar)**2).sum(-1)
+
+
+def _fit_zoff_only(x, y):
+    """Least-squares zoff for y = (x - zoff)^2/2, the real root of the cubic normal equation with least error."""
+    n = len(x)
+    coef = [n/2, -1.5*x.sum(), 1.5*(x*x).sum() - y.sum(), (x*y).sum() - (x**3).sum()/2]
+    roots = np.roots(coef)
+    roots = roots[np.abs(roots.imag) < 1e-9].real
+    sse = [((y - (x - c)**2/2)**2).sum() for c in roots]
+    return roots[int(np.argmin(sse))]
+
+
+def fit_qvar(count, sum_z, sum_var):
+    """
+    Fit qvar to the binned curve of every group, the same fits the scorer did
+    with curve_fit on (z_mid, var) of the non-empty bins.
+
+    Inputs are bin statistics shaped (ngroups, nbins) from binning.bin_stats.
+    y - z^2/2 = (s0^2 + zoff^2/2) - zoff*z is a straight line in z.
+
+    Returns a dict of arrays shaped (ngroups,):
+        s0, zoff : qvar parameters; if the best line implies s0^2 < 0 the fit is
+                   constrained to s0 = 0, where curve_fit ends up as well
+        r2       : R² of the binned curve against the fitted qvar
+        q0, q1   : qvar2 parameters s0 and s1, from y = q0^2 + q1*z^2 (q0 >= 0 likewise)
+    """
+    x, y, nz = _curves(count, sum_z, sum_var)
+    w = nz.astype(float)
+
+    a, b = _linear_fit(x, y - x*x/2, w)
+    zoff = -b
+    s0sq = a - zoff*zoff/2
+    for g in zip(*np.nonzero(s0sq < 0)):
+        zoff[g] = _fit_zoff_only(x[g][nz[g]], y[g][nz[g]])
+        s0sq[g] = 0.0
+    s0 = np.sqrt(s0sq)
+    r2 = r_squared(y, s0sq[..., None] + (x - zoff[..., None])**2/2, w)
+
+    c, q1 = _linear_fit(x*x, y, w)
+    neg = c < 0                               # constrained to q0 = 0: y = q1*z^2 through the origin
+    q1 = np.where(neg, (w*x*x*y).sum(-1) / np.where(neg, (w*x**4).sum(-1), 1.0), q1)
+    q0 = np.sqrt(np.where(neg, 0.0, c))
+    return {"s0": s0, "zoff": zoff, "r2": r2, "q0": q0, "q1": q1}
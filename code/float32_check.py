@@ -0,0 +1,42 @@
+# float32_check.py - how much does storing z and sigma as float32 change the score?
+# scores a dataset as stored (float64) and again with z and sigma rounded to float32, and prints
+# the change in every R² the scorer reports. Run it on a float64 dataset, e.g.
+#   python code/data_loader_csv.py && python code/float32_check.py dataset.parquet
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from score_submission import read_dataset, score
+
+parser = argparse.ArgumentParser(description="R² change from storing z and sigma as float32")
+parser.add_argument("paths", nargs="*", help="float64 dataset file(s) (default: as score_submission.py)")
+parser.add_argument("--tol", type=float, default=1e-4, help="largest acceptable change in R² (default %(default)s)")
+args = parser.parse_args()
+
+df = read_dataset(args.paths)
+if df["z"].dtype == np.float32:
+    sys.exit("dataset is already float32, run the check on a float64 dataset")
+
+full = score(df)
+df["z"] = df["z"].astype(np.float32)
+df["sigma"] = df["sigma"].astype(np.float32)
+half = score(df)
+
+rows = [("global R²", full.r2, half.r2)]
+rows += [(f"T = {T} R²", full.r2_by_T[T], half.r2_by_T[T]) for T in full.r2_by_T]
+rows += [("mean group R²", full.group_r2_mean, half.group_r2_mean),
+         ("median group R²", full.group_r2_median, half.group_r2_median),
+         ("distribution R²", full.dist_r2, half.dist_r2)]
+rows += [(f"distribution T = {T} R²", full.dist_r2_by_T[T], half.dist_r2_by_T[T]) for T in full.dist_r2_by_T]
+
+print(f"{len(df)} windows")
+print(f"{'':26s} {'float64':>12s} {'float32':>12s} {'change':>10s}")
+worst = 0.0
+for name, a, b in rows:
+    print(f"{name:26s} {a:12.6f} {b:12.6f} {b - a:10.2e}")
+    worst = max(worst, abs(b - a))
+print(f"largest change {worst:.2e} ({'ok' if worst <= args.tol else 'above'} tolerance {args.tol:g})")
+sys.exit(0 if worst <= args.tol else 1)
@@ -0,0 +1,270 @@
+# instrument.py - where a long run spends its time and memory
+# `with stage("window", rows=n):` records the wall time, CPU time, peak RSS and rows processed of a
+# named piece of work (stages nest), and traced(name, chunks) does the same for every chunk a
+# generator produces. The loaders, the pipeline, the scorer and the registered simulators are
+# wrapped this way, so a run only has to ask for the trace:
+#   QVAR_TRACE=trace.json python submissions/simu.ai/generate_submission.py   # JSON, opens in ui.perfetto.dev
+#   QVAR_PROFILE=score/distribution QVAR_TRACEMALLOC=write python code/data_loader_csv.py   # cProfile / tracemalloc
+#   python code/instrument.py trace.json                                      # per-stage summary of a trace
+# Peak RSS per stage comes from /proc/self/clear_refs on Linux, which also restarts the process's
+# own high-water mark (ru_maxrss), so it is only measured once tracing is asked for (a QVAR_*
+# variable or enable()); measure a peak around instrumented code with a stage of its own.
+import argparse
+import atexit
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+
+# --- memory --------------------------------------------------------------------------------
+
+def rss_mb(field="VmRSS"):
+    """VmRSS (or VmHWM, the peak) of this process in MB from /proc, None where there is none."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def reset_peak_rss():
+    """Restart the peak RSS count (Linux); elsewhere peaks are the process high-water mark."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """Peak RSS in MB since the last reset_peak_rss(), None where it cannot be read."""
+    peak = rss_mb("VmHWM")
+    if peak is None and resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024**2 if sys.platform == "darwin" else 1024)
+    return peak
+
+
+# --- stages --------------------------------------------------------------------------------
+
+@dataclass
+class StageRecord:
+    """One run of a stage. Times are seconds, `start` counted from the start of the trace."""
+    name: str
+    start: float
+    depth: int
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_mb: Optional[float] = None
+    rows: Optional[int] = None
+    profile: Optional[str] = None          # cProfile output file
+    tracemalloc: Optional[dict] = None     # peak of traced allocations and the top allocation sites
+    _peak: Optional[float] = field(default=None, repr=False)   # largest peak seen in nested stages
+
+
+def _fold(rec, peak):
+    """Count `peak` (None: unknown) in the peak of the stage `rec`."""
+    if peak is not None:
+        rec._peak = peak if rec._peak is None else max(rec._peak, peak)
+
+
+def _names(value):
+    return {n.strip() for n in (value or "").split(",") if n.strip()}
+
+
+class Tracer:
+    """
+    Collects StageRecords. Peaks nest: a stage restarts the peak RSS count,
+    and its peak is folded into the enclosing stage's before and after.
+    Peaks are only measured while `measuring`, as restarting the count
+    disturbs anyone else reading the process's peak; otherwise peak_mb is None.
+
+    path      : where write() puts the trace (default for write())
+    profile   : stage names run under cProfile ("*" for all)
+    memory    : stage names run under tracemalloc ("*" for all)
+    measure   : measure peaks even with no path, profile or memory
+    """
+
+    def __init__(self, path=None, profile=(), memory=(), measure=False):
+        self.path = path
+        self.profile = set(profile)
+        self.memory = set(memory)
+        self.measure = measure
+        self.records = []
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+        self._profiling = False
+
+    @property
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @property
+    def measuring(self):
+        return bool(self.measure or self.path or self.profile or self.memory)
+
+    def _wants(self, names, name):
+        return "*" in names or name in names
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Record the enclosed block as stage `name`; set .rows on the yielded record if not known yet."""
+        stack = self._stack
+        measuring = self.measuring
+        if stack and measuring:
+            _fold(stack[-1], peak_rss_mb())
+        rec = StageRecord(name, time.perf_counter() - self.origin, len(stack), rows=rows)
+        self.records.append(rec)
+        stack.append(rec)
+
+        profiler = None
+        if self._wants(self.profile, name) and not self._profiling:     # cProfile does not nest
+            profiler, self._profiling = cProfile.Profile(), True
+        started_tracemalloc = False
+        if self._wants(self.memory, name):
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracemalloc = True
+            tracemalloc.reset_peak()
+
+        if measuring:
+            reset_peak_rss()
+        cpu = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield rec
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            rec.cpu = time.process_time() - cpu
+            rec.wall = time.perf_counter() - self.origin - rec.start
+            if measuring:
+                _fold(rec, peak_rss_mb())
+                rec.peak_mb = rec._peak
+            rec.rows = None if rec.rows is None else int(rec.rows)
+            stack.pop()
+            if stack and measuring:
+                _fold(stack[-1], rec.peak_mb)
+            if profiler is not None:
+                self._profiling = False
+                rec.profile = self._profile_path(name, len(self.records))
+                profiler.dump_stats(rec.profile)
+            if self._wants(self.memory, name):
+                top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+                rec.tracemalloc = {"peak_mb": tracemalloc.get_traced_memory()[1] / 2**20,
+                                   "top": [f"{s.size / 2**20:.1f} MB in {s.count} blocks: {s.traceback}" for s in top]}
+                if started_tracemalloc:
+                    tracemalloc.stop()
+
+    def _profile_path(self, name, k):
+        base = Path(self.path).with_suffix("") if self.path else Path("qvar_profile")
+        return f"{base}.{k:04d}.{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}.prof"
+
+    def traced(self, name, iterable, rows=len):
+        """Yield from `iterable`, recording the production of each item as stage `name` with rows(item) rows."""
+        it = iter(iterable)
+        while True:
+            with self.stage(name) as rec:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    self.records.remove(rec)        # the final, empty call is not a chunk
+                    return
+                rec.rows = None if rows is None else rows(item)
+            yield item
+
+    def summary(self):
+        """Per stage name: calls, total wall and CPU seconds, largest peak RSS, rows and rows/s."""
+        return summarize([asdict(r) for r in self.records])
+
+    def to_dict(self):
+        """The trace as JSON: every stage record, plus Chrome trace events for ui.perfetto.dev."""
+        stages = [{k: v for k, v in asdict(r).items() if not k.startswith("_")} for r in self.records]
+        events = [{"name": r["name"], "ph": "X", "ts": r["start"] * 1e6, "dur": r["wall"] * 1e6,
+                   "pid": os.getpid(), "tid": r["depth"],
+                   "args": {k: r[k] for k in ("cpu", "peak_mb", "rows") if r[k] is not None}} for r in stages]
+        return {"argv": sys.argv, "pid": os.getpid(), "stages": stages, "traceEvents": events}
+
+    def write(self, path=None):
+        path = path or self.path
+        Path(path).write_text(json.dumps(self.to_dict(), indent=1))
+        return path
+
+
+def summarize(stages):
+    """summary() of stage records given as dicts (e.g. the "stages" of a trace file)."""
+    df = pd.DataFrame(stages, columns=["name", "wall", "cpu", "peak_mb", "rows"])
+    out = df.groupby("name", sort=False).agg(calls=("wall", "size"), wall=("wall", "sum"), cpu=("cpu", "sum"),
+                                             peak_mb=("peak_mb", "max"), rows=("rows", lambda r: r.sum(min_count=1)))
+    out["rows_per_s"] = out["rows"] / out["wall"].where(out["wall"] > 0)
+    out["rows"] = out["rows"].astype("Int64")
+    return out.reset_index()
+
+
+def print_summary(table, file=sys.stdout):
+    with pd.option_context("display.width", 200, "display.max_rows", 200):
+        print(table.to_string(index=False, float_format=lambda v: f"{v:,.3f}"), file=file)
+
+
+# the tracer the repository's code records into, set up from the environment
+TRACER = Tracer(os.environ.get("QVAR_TRACE") or None,
+                _names(os.environ.get("QVAR_PROFILE")), _names(os.environ.get("QVAR_TRACEMALLOC")))
+stage = TRACER.stage
+traced = TRACER.traced
+
+
+def enable(path=None, profile=(), memory=()):
+    """
+    Turn on what the QVAR_* variables would: measure peaks, write the trace to
+    `path` at exit, profile stages.
+    """
+    TRACER.measure = True
+    TRACER.path = path or TRACER.path
+    TRACER.profile |= set(profile)
+    TRACER.memory |= set(memory)
+
+
+def report(file=sys.stdout):
+    """Print the per-stage summary of this process so far."""
+    print_summary(TRACER.summary(), file)
+
+
+@atexit.register
+def _write_at_exit():
+    if TRACER.path and TRACER.records:
+        TRACER.write()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a stage trace written with QVAR_TRACE")
+    parser.add_argument("trace", help="trace JSON file")
+    parser.add_argument("--depth", type=int, default=None, help="only stages nested at most this deep")
+    args = parser.parse_args(argv)
+    stages = json.loads(Path(args.trace).read_text())["stages"]
+    if args.depth is not None:
+        stages = [s for s in stages if s["depth"] <= args.depth]
+    print_summary(summarize(stages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# models.py - the submitted models behind one streaming interface
+# each model is a dataclass of its parameters, registered under a short name, with
+#   simulate(n_days, rng, chunk_days) -> iterator of blocks of daily log returns
+# so the loader (data_loader_csv.py --model), the pipeline, sweep.py, calibrate.py and the
+# benchmarks run any of them the same way, without the CSV round trip.
+#   python code/models.py --list
+#   python code/models.py regime_mixture sigma0=0.2824 mu=0.0232 --n-days 5000000 --output dataset.parquet
+#   result = run_pipeline(simulate("cir_poisson", 1_000_000, seed=1, kappa=1.0))      # see pipeline.py
+import argparse
+import ast
+import dataclasses
+import hashlib
+import importlib
+import importlib.util
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from batch_sim import CIRPoissonPaths, garch_paths
+from instrument import traced
+from pipeline import log_returns
+
+CODE = Path(__file__).resolve().parent
+SUBMISSIONS = CODE.parent / "submissions"
+CHUNK_DAYS = 250_000
+MODELS = {}
+
+
+def load_object(spec):
+    """
+    The object named by "file.py:name" or "module:name". Files are loaded by
+    path, so names with dots (equityquant.dev_model.py) work, and the module
+    is kept in sys.modules under its file stem so its objects can be pickled.
+    """
+    where, name = spec.rsplit(":", 1)
+    return getattr(load_module(where), name)
+
+
+def load_module(where):
+    if not where.endswith(".py"):
+        return importlib.import_module(where)
+    path = Path(where).resolve()
+    module_name = path.stem.replace(".", "_")
+    module = sys.modules.get(module_name)
+    if module is not None and Path(getattr(module, "__file__", "")).resolve() == path:
+        return module
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.path.insert(0, str(path.parent))           # for the model's own imports
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def register(name):
+    """Class decorator adding a model to MODELS under `name`."""
+    def add(cls):
+        cls.name = name
+        MODELS[name] = cls
+        return cls
+    return add
+
+
+class Model:
+    """
+    Base of the registered models. A model is a dataclass whose fields are
+    its parameters (defaults: the submitted values) and which implements
+    simulate(n_days, rng, chunk_days). `sources` are the files the model's
+    code lives in; their hash keys the sweep cache.
+    """
+    name = None
+    sources = ()
+
+    def simulate(self, n_days, rng, chunk_days=CHUNK_DAYS):
+        """
+        Yield the model's daily log returns in blocks of about `chunk_days`,
+        `n_days` values in all, drawing from the numpy Generator `rng`. A NaN
+        return separates independent paths (windows never straddle one).
+        """
+        raise NotImplementedError
+
+    def params(self):
+        return dataclasses.asdict(self)
+
+
+@register("regime_mixture")
+@dataclass
+class RegimeMixture(Model):
+    """
+    submissions/simu.ai: piecewise-constant variance regimes with Gamma(3/2,
+    σ₀²) precision (RegimeMixtureSimulator). With the Generator from
+    default_rng(seed) the path is that of simulate_regime_mixture_qvar(seed=seed).
+
+    With `block_days` set, the path is simulated in blocks of that many days
+    on `workers` processes (None: all cores) by iter_regime_mixture_parallel
+    instead: a different draw, which depends on block_days but not on the
+    number of workers; chunk_days is then block_days.
+    """
+    sigma0: float = 0.282388
+    mu: float = 0.023182
+    samples_per_day: int = 4
+    mean_regime_length_days: Optional[float] = None
+    max_window_days: Optional[int] = 130
+    mean_reversion_rate: float = 0.001
+    daily: bool = False
+    block_days: Optional[int] = None
+    workers: Optional[int] = None
+    sources = (SUBMISSIONS / "simu.ai" / "model_simulation.py",)
+
+    def simulate(self, n_days, rng, chunk_days=CHUNK_DAYS):
+        if self.block_days is not None:
+            if self.daily:
+                raise ValueError("the block-parallel regime mixture has no daily mode")
+            blocks = load_object(f"{self.sources[0]}:iter_regime_mixture_parallel")(
+                self.sigma0, self.mu, n_days, self.samples_per_day, self.mean_regime_length_days,
+                self.max_window_days, self.mean_reversion_rate, rng, self.block_days, self.workers)
+            return log_returns(L for L, _ in blocks)
+        Simulator = load_object(f"{self.sources[0]}:RegimeMixtureSimulator")
+        sim = Simulator(self.sigma0, self.mu, n_days, self.samples_per_day, self.mean_regime_length_days,
+                        self.max_window_days, self.mean_reversion_rate, rng, self.daily)
+        return sim.iter_returns(chunk_days)
+
+
+@register("cir_poisson")
+@dataclass
+class CIRPoisson(Model):
+    """
+    submissions/equityquant.dev: CIR-like precision -> Poisson count ->
+    Gaussian sqrt(N) returns (batch_sim.CIRPoissonPaths with one path). With
+    default_rng(seed) the returns are those of simulate_price_series(n_days + 1, seed=seed).
+    """
+    sigma0: float = 0.25
+    c_int: float = 10.0
+    kappa: float = 0.50
+    a_shape: float = 1.5
+    lam_cap: float = 500.0
+    burn_in: int = 2000
+    sources = (CODE / "batch_sim.py", SUBMISSIONS / "equityquant.dev" / "equityquant.dev_model.py")
+
+    def simulate(self, n_days, rng, chunk_days=CHUNK_DAYS):
+        sim = CIRPoissonPaths(1, n_days + 1, 100.0, self.sigma0, self.c_int, self.kappa, rng,
+                              self.a_shape, self.lam_cap, self.burn_in)
+        return log_returns(sim.next_log_prices(chunk_days) for _ in range(0, n_days + 1, chunk_days))
+
+
+@register("garch")
+@dataclass
+class Garch(Model):
+    """
+    submissions/tingjun2: GARCH(1,1) with alpha + beta = 0.99, variance
+    targeted at sigma_annual and the squared log return as shock, run as
+    independent paths of `path_days` days (batch_sim.garch_paths), NaN
+    between paths. Paths are drawn `paths_per_block` at a time whatever
+    chunk_days is, so a shorter run is a prefix of a longer one.
+    """
+    beta: float = 0.8
+    mu_annual: float = 0.06
+    sigma_annual: float = 0.425
+    v_max: Optional[float] = 4.0**2 / 252
+    path_days: int = 2500
+    paths_per_block: int = 400
+    sources = (CODE / "batch_sim.py",)
+
+    def simulate(self, n_days, rng, chunk_days=CHUNK_DAYS):
+        left, first = n_days, True
+        while left > 0:
+            prices, _ = garch_paths(self.beta, self.mu_annual, self.sigma_annual, self.paths_per_block,
+                                    self.path_days, seed=rng, v_max=self.v_max)
+            ret = np.diff(np.log(prices), axis=1)
+            ret = np.hstack([np.full((len(ret), 1), np.nan), ret]).ravel()   # NaN before each path
+            if first:
+                ret, first = ret[1:], False
+            yield ret[:left]
+            left -= len(ret)
+
+
+@register("ig_gbm")
+@dataclass
+class InverseGammaGBM(Model):
+    """
+    submissions/tags: GBM whose variance is drawn afresh every day from
+    InvGamma(3/2, σ₀²), with mu = σ₀² (zero expected log drift) unless given.
+    Variances and normals come from two streams spawned from `rng`, so the
+    path does not depend on chunk_days.
+    """
+    sigma0: float = 0.259
+    mu: Optional[float] = None
+    sources = ()
+
+    def simulate(self, n_days, rng, chunk_days=CHUNK_DAYS):
+        dt = 1.0 / 252.0
+        mu = self.sigma0**2 if self.mu is None else self.mu
+        var_rng, eps_rng = rng.spawn(2)
+        for start in range(0, n_days, chunk_days):
+            n = min(chunk_days, n_days - start)
+            V = self.sigma0**2 / var_rng.standard_gamma(1.5, n)      # InvGamma(3/2, scale σ₀²)
+            yield (mu - 0.5 * V) * dt + np.sqrt(V * dt) * eps_rng.standard_normal(n)
+
+
+def get_model(name, **params):
+    """The registered model `name` with `params` replacing its defaults."""
+    try:
+        cls = MODELS[name]
+    except KeyError:
+        raise ValueError(f"unknown model {name!r}, registered: {', '.join(MODELS)}") from None
+    return cls(**params)
+
+
+def simulate(model, n_days, seed=None, chunk_days=CHUNK_DAYS, **params):
+    """
+    Daily log returns of a model (a Model or a registered name) in blocks,
+    from default_rng(seed); each block is a "simulate/<name>" stage (instrument.py).
+    """
+    if isinstance(model, str):
+        model = get_model(model, **params)
+    return traced(f"simulate/{model.name}", model.simulate(n_days, np.random.default_rng(seed), chunk_days))
+
+
+def parse_params(items):
+    """
+    name=value (or name=v1,v2,...) command line items as a dict of values or
+    value lists; values are Python literals (0.25, None, True).
+    """
+    out = {}
+    for item in items or []:
+        name, value = item.split("=", 1)
+        values = [ast.literal_eval(v) for v in value.split(",")]
+        out[name] = values if len(values) > 1 else values[0]
+    return out
+
+
+def source_hash(name):
+    """Hash of the code of a registered model: this file and the model's sources."""
+    h = hashlib.sha256(Path(__file__).read_bytes())
+    for path in MODELS[name].sources:
+        h.update(Path(path).read_bytes())
+    return h.hexdigest()[:16]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a registered model, window it and score it")
+    parser.add_argument("model", nargs="?", help="registered model name (see --list)")
+    parser.add_argument("params", nargs="*", metavar="NAME=VALUE", help="model parameters")
+    parser.add_argument("--list", action="store_true", help="list the models and their default parameters")
+    parser.add_argument("--n-days", type=lambda v: int(float(v)), default=1_000_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--chunk-days", type=int, default=CHUNK_DAYS)
+    parser.add_argument("--stride", type=int, default=None, help="days between window starts (default: T)")
+    parser.add_argument("-o", "--output", help="also write the windows to this dataset file")
+    args = parser.parse_args(argv)
+
+    if args.list or args.model is None:
+        for name, cls in MODELS.items():
+            print(f"{name:16s} {cls.__name__:16s} {cls().params()}")
+        return
+
+    from pipeline import run_pipeline
+    from score_submission import print_report, score
+    from windowing import HORIZONS
+    returns = simulate(args.model, args.n_days, args.seed, args.chunk_days, **parse_params(args.params))
+    result = run_pipeline(returns, HORIZONS, args.stride, output=args.output)
+    print(f" → {result.nrows} clean windows")
+    print_report(score(result.sketch))
+
+
+if __name__ == "__main__":
+    main()
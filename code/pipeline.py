@@ -0,0 +1,89 @@
+# pipeline.py - simulate → window → score in one process, without the CSV round trip
+# a model yields its path in chunks; the chunks go straight through windowing.WindowStream into
+# WindowSpill and a sketch, so the score is known as soon as the last chunk is in. The parquet
+# dataset and a price CSV are optional side outputs.
+#   from pipeline import run_pipeline, log_returns
+#   result = run_pipeline(log_returns(sim.iter_log_prices()), output="dataset.parquet")
+#   print_report(score(result.sketch))
+import os
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from binning import N_SEGMENTS
+from dataset_io import ROW_GROUP_SIZE, WindowSpill
+from instrument import stage
+from sketch import Sketch, SketchBuilder
+from windowing import HORIZONS, WindowStream
+
+
+def log_returns(log_prices):
+    """
+    Daily log returns of a log-price path that arrives in consecutive chunks,
+    the same values as np.diff on the whole path.
+    """
+    last = None
+    for chunk in log_prices:
+        chunk = np.asarray(chunk, dtype=float)
+        ret = np.diff(chunk) if last is None else np.diff(np.concatenate([[last], chunk]))
+        if len(chunk):
+            last = chunk[-1]
+        yield ret
+
+
+def write_price_csv(log_prices, path, column="Price"):
+    """
+    Pass log-price chunks through unchanged while writing exp() of them to a
+    CSV with one `column`, the file code/data_loader_csv.py reads (the same
+    file as model_simulation.generate_price_csv writes).
+    """
+    with open(path, "w", newline="") as f:
+        header = True
+        for chunk in log_prices:
+            with stage("csv_write", rows=len(chunk)):
+                pd.DataFrame({column: np.exp(np.asarray(chunk, dtype=float))}).to_csv(f, header=header, index=False)
+            header = False
+            yield chunk
+
+
+@dataclass
+class PipelineResult:
+    """What run_pipeline produced: the window count and, if asked for, the sketch."""
+    nrows: int
+    sketch: Optional[Sketch] = None
+    output: Optional[str] = None
+
+
+def run_pipeline(returns, horizons=HORIZONS, stride=None, output=None, sketch=True,
+                 n_segments=N_SEGMENTS, float32=False, ticker="Model", row_group_size=ROW_GROUP_SIZE):
+    """
+    Window a return series that arrives in chunks, as code/data_loader_csv.py
+    does for a CSV.
+
+    returns : iterable of arrays of daily log returns, in order
+    output  : dataset file to write (schema of data_loader_csv.py), or None
+    sketch  : build the q-variance sketch that score_submission.score() scores
+    stride  : days between window starts, None for non-overlapping windows
+
+    Returns a PipelineResult. Memory is bounded by the chunk size and the
+    spill buffers, not by the length of the series.
+    """
+    stream = WindowStream(horizons, stride)
+    spill = WindowSpill(horizons)
+    for ret in returns:
+        with stage("window") as rec:
+            cols = stream.push(ret)
+            rec.rows = len(cols["T"])
+        with stage("spill", rows=len(cols["T"])):
+            spill.add(cols)
+
+    builder = SketchBuilder(n_rows=spill.nrows(), n_segments=n_segments) if sketch else None
+    with stage("write", rows=spill.nrows()):
+        nrows = spill.write(output, ticker, row_group_size, float32=float32, sketch=builder)
+    with stage("sketch", rows=nrows):
+        result = builder.finish() if builder is not None else None
+    return PipelineResult(nrows, result, None if output is None else str(output))
@@ -0,0 +1,138 @@
+# price_sources.py - where data_loader.py gets daily closing prices from
+# a source maps a ticker to a pd.Series of closes indexed by date
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+
+class PriceSource:
+    """Interface for price sources: fetch(ticker) returns a Series of daily closes indexed by date."""
+
+    name = "base"
+
+    def fetch(self, ticker):
+        raise NotImplementedError
+
+
+class YFinanceSource(PriceSource):
+    """Full adjusted close history from Yahoo Finance, as the original loader used."""
+
+    name = "yfinance"
+
+    def fetch(self, ticker):
+        import yfinance as yf   # only needed when actually downloading
+        # Ticker.history rather than yf.download: download fills module-global result dicts
+        # and is not safe to call from several threads (fetch_prices runs a pool)
+        close = yf.Ticker(ticker).history(period="max", auto_adjust=True)["Close"]
+        if close.empty:   # yfinance reports a failed download as an empty frame, not an error
+            raise ValueError(f"{ticker}: no prices from yfinance")
+        if close.index.tz is not None:   # history() gives exchange-local timestamps, download() naive dates
+            close.index = close.index.tz_localize(None)
+        return close.rename(ticker)
+
+
+class LocalDirectorySource(PriceSource):
+    """
+    Offline source reading <directory>/<ticker>.parquet or <ticker>.csv. Files
+    need a date column (or date index) and a 'Close' or 'Price' column.
+    """
+
+    name = "local"
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def fetch(self, ticker):
+        path = self.directory / f"{ticker}.parquet"
+        if path.exists():
+            df = pd.read_parquet(path)
+        else:
+            path = self.directory / f"{ticker}.csv"
+            if not path.exists():
+                raise FileNotFoundError(f"no prices for {ticker} in {self.directory}")
+            df = pd.read_csv(path)
+        return _to_close_series(df, ticker)
+
+
+class CachedSource(PriceSource):
+    """
+    Wraps another source with an on-disk per-ticker cache. Prices are stored in
+    <cache_dir>/<ticker>.parquet with a <ticker>.json sidecar recording the
+    source, fetch time and date range; a cached ticker is reused until it is
+    older than `max_age` (None means never refetch).
+    """
+
+    def __init__(self, source, cache_dir="cache", max_age=timedelta(days=1)):
+        self.source = source
+        self.cache_dir = Path(cache_dir)
+        self.max_age = max_age
+        self.name = f"cached:{source.name}"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def metadata(self, ticker):
+        path = self.cache_dir / f"{ticker}.json"
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def is_fresh(self, ticker):
+        meta = self.metadata(ticker)
+        if meta is None or meta.get("source") != self.source.name:
+            return False
+        if not (self.cache_dir / f"{ticker}.parquet").exists():
+            return False
+        if self.max_age is None:
+            return True
+        fetched = datetime.fromisoformat(meta["fetched"])
+        return datetime.now(timezone.utc) - fetched < self.max_age
+
+    def fetch(self, ticker):
+        if self.is_fresh(ticker):
+            return pd.read_parquet(self.cache_dir / f"{ticker}.parquet")[ticker]
+
+        close = self.source.fetch(ticker).rename(ticker)
+        if close.empty:   # never cache a failed fetch as fresh
+            raise ValueError(f"{ticker}: no prices from {self.source.name}")
+        close.to_frame().to_parquet(self.cache_dir / f"{ticker}.parquet")
+        meta = {
+            "source": self.source.name,
+            "fetched": datetime.now(timezone.utc).isoformat(),
+            "rows": int(len(close)),
+            "first": str(close.index[0].date()) if len(close) else None,
+            "last": str(close.index[-1].date()) if len(close) else None,
+        }
+        (self.cache_dir / f"{ticker}.json").write_text(json.dumps(meta, indent=1))
+        return close
+
+
+def fetch_prices(tickers, source, workers=16):
+    """
+    Fetch many tickers from a thread pool. Yields (ticker, close, error) in the
+    order of `tickers`; close is None and error holds the exception on failure,
+    so one bad ticker does not stop the whole run.
+    """
+    def fetch_one(ticker):
+        try:
+            return source.fetch(ticker), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for ticker, (close, err) in zip(tickers, pool.map(fetch_one, tickers)):
+            yield ticker, close, err
+
+
+def _to_close_series(df, ticker):
+    """Pick the close column and a DatetimeIndex out of a loaded price table."""
+    if not isinstance(df.index, pd.DatetimeIndex):
+        datecol = next((c for c in df.columns if str(c).lower() in ("date", "datetime")), None)
+        if datecol is None:
+            raise ValueError(f"{ticker}: no date column")
+        df = df.set_index(pd.to_datetime(df[datecol]))
+    col = next((c for c in ("Close", "Price", ticker) if c in df.columns), None)
+    if col is None:
+        raise ValueError(f"{ticker}: no 'Close' or 'Price' column")
+    return df[col].astype(float).rename(ticker)
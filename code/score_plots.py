@@ -0,0 +1,120 @@
+# score_plots.py - the scorer's figures, drawn from a ScoreReport
+# imported by score_submission.py only when plots are asked for, so scoring itself never loads matplotlib
+from pathlib import Path
+
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
+from matplotlib import colormaps
+
+from binning import binned_curve
+from density_plot import density_scatter
+from instrument import stage
+from score_submission import BINS, WIDE_BINS, WIDE_ZMAX, WIDE_DELZ, ZBINS, ZLIM, TVEC, qvar, quantum_density
+
+
+def plot_qvariance(report, data=None):
+    """Figure 1: every window (if `data` is given), the binned curve and the target parabola."""
+    zmax = BINS[-1]
+    ymax = 0.35
+    fitted = qvar(report.curve.z_mid, report.sigma0, report.zoff)
+
+    fig = plt.figure(figsize=(9,7))
+    if data is not None:   # density image of every window, costs the same for 1e5 or 1e8 windows
+        density_scatter(plt.gca(), data.z, data.sigma**2, (-zmax, zmax), (0.0, ymax), color='steelblue')
+    plt.plot(report.curve.z_mid, report.curve['var'], 'b-', lw=3)     # label='binned'
+    plt.plot(report.curve.z_mid, fitted, 'red', lw=3,
+             label=f'σ₀ = {report.sigma0:.3f}, zoff = {report.zoff:.3f}, R² = {report.r2:.3f}')
+
+    plt.xlabel('z (scaled log return)', fontsize=12)
+    plt.ylabel('Annualised variance', fontsize=12)
+    plt.title('Q-Variance: all data T=1 to 26 weeks', fontsize=14)
+    plt.xlim(-zmax, zmax)
+    plt.ylim(0.0, ymax)
+    plt.legend(fontsize=12, loc='upper right')
+    plt.grid(alpha=0.3)
+    plt.tight_layout()
+    return fig
+
+
+def plot_groups(report):
+    """Figure 2: binned curve of every ticker (or segment), coloured by its fitted σ₀."""
+    normcol = mcolors.Normalize(vmin=0, vmax=0.3)
+    cmap = colormaps['coolwarm']
+    stats, fits = report.group_stats, report.group_fits
+
+    fig, ax = plt.subplots(figsize=(9,7))
+    for i in range(len(report.groups)):
+        binned = binned_curve(stats["count"][i], stats["sum_z"][i], stats["sum_var"][i])
+        s0, zoff, r2 = fits["s0"][i], fits["zoff"][i], fits["r2"][i]
+        colcur = cmap(normcol(max(0,np.nan_to_num(s0))))
+        ax.plot(binned.z_mid, binned['var'], '-', c=colcur, alpha = 0.5, lw=2, label=f'σ₀ = {s0:.3f}, zoff = {zoff:.3f}, R² = {r2 :.3f}')
+
+    ax.set_xlabel('z (scaled log return)', fontsize=12)
+    ax.set_ylabel('Annualised variance', fontsize=12)
+    ax.set_title(f'Mean R2 for individual stocks = {report.group_r2_mean:4f},  median = {report.group_r2_median:4f}', fontsize=14)
+    ymax2 = 1.2
+    ax.axis([-WIDE_ZMAX+WIDE_DELZ/2, WIDE_ZMAX-WIDE_DELZ/2, 0, ymax2])   # uses ymax2 for ensemble plot
+    return fig
+
+
+def plot_periods(report):
+    """Figure 3: binned curve for each period in TVEC against the target parabola."""
+    zgrid = (WIDE_BINS[:-1] + WIDE_BINS[1:]) / 2
+    fig = plt.figure(figsize=(9,7))
+    plt.plot(zgrid, qvar(zgrid, report.sigma0, report.zoff), 'red', lw=3,
+             label=f'σ₀ = {report.sigma0:.3f}, zoff = {report.zoff:.3f}, R² = {report.r2:.3f}')
+    for j, Tcur in enumerate(TVEC):
+        stats = report.T_stats
+        binned = binned_curve(stats["count"][j], stats["sum_z"][j], stats["sum_var"][j])
+        colcur = str(Tcur/100)
+        plt.plot(binned.z_mid, binned['var'], c=colcur, lw=2, label=f'T = {Tcur/5:.0f}, R² = {report.r2_by_T[Tcur]:.3f}')
+
+    plt.xlabel('z (scaled log return)', fontsize=12)
+    plt.ylabel('Annualised variance', fontsize=12)
+    plt.legend(fontsize=10, loc='upper center')
+    plt.grid(alpha=0.3)
+    plt.title('All stocks T=2, 4, 8, 16 weeks – Q-Variance', fontsize=14)
+    return fig
+
+
+def plot_distribution(report):
+    """Figure 4: fitted quantum density and the z histogram for each period."""
+    zmid = (ZBINS[:-1] + ZBINS[1:]) / 2
+    z_fine = np.linspace(-ZLIM, ZLIM, 1000)
+    fig = plt.figure(figsize=(9,7))
+    plt.plot(z_fine, quantum_density(z_fine, report.dist_sigma0, report.dist_zoff),
+             color='red', lw=4,
+             label=f'Q-Variance fit: σ₀ = {report.dist_sigma0:.3f}, R² = {report.dist_r2:.4f}')
+    for j, Tcur in enumerate(report.dist_T):
+        colcur = str(Tcur/(max(report.dist_T)+20))
+        plt.plot(zmid, report.T_hist[j], c=colcur, lw=2, label=f'T = {Tcur/5:.0f}, R² = {report.dist_r2_by_T[Tcur]:.3f}')
+
+    plt.title('Q-Variance: T dependence', fontsize=18, pad=20)
+    plt.xlabel('Scaled log-return z', fontsize=14)
+    plt.ylabel('Density', fontsize=14)
+    plt.xlim(-1.2, 1.2)
+    plt.legend(fontsize=10, loc='upper right')
+    plt.grid(alpha=0.3)
+    plt.tight_layout()
+    return fig
+
+
+def plot_report(report, data=None, show=True, save_dir=None):
+    """
+    Draw the four scorer figures. `data` (the scored DataFrame) is only
+    needed for the density image of individual windows in figure 1. With
+    `save_dir` the figures are written there as figure_1.png ... figure_4.png.
+    """
+    with stage("plots"):
+        figs = [plot_qvariance(report, data), plot_groups(report), plot_periods(report), plot_distribution(report)]
+    if save_dir is not None:
+        Path(save_dir).mkdir(parents=True, exist_ok=True)
+        for k, fig in enumerate(figs, 1):
+            with stage("savefig"):
+                fig.savefig(Path(save_dir) / f"figure_{k}.png", dpi=150, bbox_inches='tight')
+    if show:
+        plt.show()
+    else:
+        plt.close('all')
+    return figs
@@ -1,263 +1,290 @@
-import pandas as pd
-import numpy as np
-from scipy.optimize import curve_fit
-from scipy.stats import norm, poisson
-from sklearn.metrics import r2_score
-import matplotlib.pyplot as plt
-import matplotlib.cm as cm
-import matplotlib.colors as mcolors
+# score_submission.py - score a q-variance dataset against the target parabola
+# score(dataset) does only the numeric work and returns a ScoreReport; plots live in score_plots.py
+# and are imported only when asked for. From the command line:
+#   python code/score_submission.py [dataset.parquet | *.sketch.parquet ...] [--json] [--no-plot] [--save-figures DIR]
+import argparse
+import json
+import math
 import os
+import sys
+from dataclasses import dataclass, field
 
-# load the parquet files from data_loader.py
-
-if os.path.isfile("dataset.parquet"):
-    df= pd.read_parquet("dataset.parquet")  # READ SUBMISSION DATA
-else:
-    df = pd.concat([pd.read_parquet("dataset_part1.parquet"),pd.read_parquet("dataset_part2.parquet"),pd.read_parquet("dataset_part3.parquet")])
-
-
-df["var"] = df.sigma**2
-TICKERS1 = np.unique(df["ticker"])  # use original tickers
-
-print(f"{len(df)} windows")
-print(f"z has NaNs: {df['z'].isna().sum()}")  # → 0
-
-df_orig = df.copy()
-
-# divide dataframe into equal segments and rename 'ticker' column based on segment number
-# note that parquet file has ticker on outer loop so this is like selecting certain stocks
-def assign_segmented_tickers(df,N_SEGMENTS):
-    nr = len(df)
-   
-    rows_per_segment = nr // N_SEGMENTS
-    nextra = nr % N_SEGMENTS
-    
-    # Drop extra rows if necessary
-    if nextra > 0:
-        df = df.iloc[:nr - nextra].copy()
-        nr = len(df)
-    
-    # Create an array of segment numbers
-    segment_ids = np.arange(1, N_SEGMENTS + 1).repeat(rows_per_segment)
-    
-    # Use list comprehension to handle string concatenation in standard Python, 
-    # then convert back to a NumPy array if needed, or just assign directly.
-    new_tickers = ['V' + str(i) for i in segment_ids]
-    
-    # Assign the new ticker names to the 'ticker' column
-    df['ticker'] = new_tickers
-    
-    return df
-
-zmax = 0.6  #0.6 or 1
-delz = 0.025*2
-nbins = int(2*zmax/delz + 1)
-bins = np.linspace(-zmax, zmax, nbins)         # fixed bins
-ymax = 0.35
-
-# create data frame with e.g. zbin = (-0.601, -0.55], z_mid, sigma
-binned = (df.assign(z_bin=pd.cut(df.z, bins=bins, include_lowest=True))
-               .groupby('z_bin',observed=False)
-               .agg(z_mid=('z', 'mean'), var=('var', 'mean'))
-               .dropna())
-
-def qvar(z, s0, zoff):    # define q-variance function, parameter is minimal volatility s0 and zoff
-    return (s0**2 + (z - zoff)**2 / 2)
-
-def qvar2(z, s0, s1):    # define q-variance function, parameter is minimal volatility s0 and qcoef
-    return (s0**2 + s1*z**2 )
-
-# curve_fit returns a value popt and a covariance pcov, the _ means we ignore the pcov
-popt = [0.2586, 0.0214]  # same as optimized fit to data  # for competition score should fit original parabola
-#popt, _ = curve_fit(qvar, binned.z_mid, binned["var"], p0=[0.2, 0])  # fit this data instead
-
-fitted = qvar(binned.z_mid, popt[0], popt[1])  # cols are z_bin, which is a range like (-0.601, -0.55], and qvar
-r2 = 1 - np.sum((binned["var"] - fitted)**2) / np.sum((binned["var"] - binned["var"].mean())**2)
-
-print(f"σ₀ = {popt[0]:.4f}  zoff = {popt[1]:.4f}  R² = {r2:.4f}")
-
-# plot of all stocks
-markfac = 1  # default is 1, can increase to 3 if less data points
-plt.figure(figsize=(9,7))
-plt.scatter(df.z, df['var'], c='steelblue', alpha=markfac*0.1, s=markfac*1, edgecolor='none')
-numeric_array = (1 - df["T"]/130)
-string_array = [str(x) for x in numeric_array]
-plt.plot(binned.z_mid, binned['var'], 'b-', lw=3)     # label='binned'
-plt.plot(binned.z_mid, fitted, 'red', lw=3, label=f'σ₀ = {popt[0]:.3f}, zoff = {popt[1]:.3f}, R² = {r2:.3f}')
-
-plt.xlabel('z (scaled log return)', fontsize=12)
-plt.ylabel('Annualised variance', fontsize=12)
-plt.title('Q-Variance: all data T=1 to 26 weeks', fontsize=14)
-
-plt.xlim(-zmax, zmax) 
-plt.ylim(0.0, ymax)
-
-plt.legend(fontsize=12, loc='upper right')
-plt.grid(alpha=0.3)
-plt.tight_layout()
-##plt.savefig("figure_1_1.png", dpi=300, bbox_inches='tight')
-
-
-normcol = mcolors.Normalize(vmin=0, vmax=0.3)
-cmap = cm.get_cmap('coolwarm')
-
-
-# now change the fit for all and get coefficients qcopt for case T=5 ONLY
-zmax = 1  # larger grid
-ymax = 0.8
-
-delz = 0.025*4  # wider bin for these noisy plots
-nbins = int(2*zmax/delz + 1)
-bins = np.linspace(-zmax, zmax, nbins)         # fixed bins
-
-if len(np.unique(df_orig["ticker"])) == 1:     # set to >=1 to divide all data, or == 1 to divide model data only ###
-    print("dividing into 500 separate runs") 
-    df = assign_segmented_tickers(df_orig,500)  # divide and add tickers
-else:
-    print("data already divided into separate tickers") 
-    df = df_orig
-
-
-TICKERS = np.unique(df["ticker"])
-r2vec = np.zeros(len(TICKERS))
-q0vec = np.zeros(len(TICKERS))
-q1vec = np.zeros(len(TICKERS))
-i = 0
-fig, ax = plt.subplots(figsize=(9,7))
-for tickcur in TICKERS:
-    dfcur = df[ (df["ticker"] == tickcur)  ].copy()   # & (df["T"] == 5)
-    binned = (dfcur.assign(z_bin=pd.cut(dfcur.z, bins=bins, include_lowest=True))
-                   .groupby('z_bin',observed=False)
-                   .agg(z_mid=('z', 'mean'), var=('var', 'mean'))
-                   .dropna())
-
-    popt, _ = curve_fit(qvar, binned.z_mid, binned["var"], p0=[0.2, 0])  # custom fit
-    qopt, _ = curve_fit(qvar2, binned.z_mid, binned["var"], p0=[0.2, 0.5])  # custom fit to quadratic term
-    fitted = qvar(binned.z_mid, popt[0], popt[1])    # use fit for whole data set
-    r2vec[i] = 1 - np.sum((binned["var"] - fitted)**2) / np.sum((binned["var"] - binned["var"].mean())**2)
-    q0vec[i] = qopt[0]
-    q1vec[i] = qopt[1]
-    #print(f"ticker = {tickcur} σ₀ = {popt[0]:.4f}  zoff = {popt[1]:.4f}  R² = {r2:.4f}")
-    colcur = cmap(normcol(max(0,popt[0])))   # str(Tcur/100)
-    ax.plot(binned.z_mid, binned['var'], '-', c=colcur, alpha = 0.5, lw=2, label=f'σ₀ = {popt[0]:.3f}, zoff = {popt[1]:.3f}, R² = {r2vec[i] :.3f}') 
-    i = i+1
-
-r2mean = np.mean(r2vec)
-r2median = np.median(r2vec)
-ax.set_xlabel('z (scaled log return)', fontsize=12)
-ax.set_ylabel('Annualised variance', fontsize=12)
-ax.set_title(f'Mean R2 for individual stocks = {r2mean:4f},  median = {r2median:4f}', fontsize=14)
-#ax.legend(fontsize=12)
-
-ymax2 = 1.2
-ax.axis([-zmax+delz/2, zmax-delz/2, 0, ymax2])   # uses ymax2 for ensemble plot
-
-data = df_orig.copy()
-# now plot q-variance for different periods T, check for period-depenedence
-# plot with periods
-TVEC = [5, 10, 20, 40, 80]
-
-plt.figure(figsize=(9,7))
-popt = [0.2586, 0.0214]  # same as optimized fit to data  # for competition score should fit original parabola
-fitted = qvar(binned.z_mid, popt[0], popt[1])  # cols are z_bin, which is a range like (-0.601, -0.55], and qvar
-#plt.plot(binned.z_mid, binned['var'], 'b-', lw=3,label='all T')  
-plt.plot(binned.z_mid, fitted, 'red', lw=3, label=f'σ₀ = {popt[0]:.3f}, zoff = {popt[1]:.3f}, R² = {r2:.3f}')
-
-for Tcur in TVEC:
-    datacur = data[(data["T"] == Tcur)].copy()
-    binned = (datacur.assign(z_bin=pd.cut(datacur.z, bins=bins, include_lowest=True))
-                   .groupby('z_bin',observed=False)
-                   .agg(z_mid=('z', 'mean'), var=('var', 'mean'))
-                   .dropna())
-
-    # popt, _ = curve_fit(qvar, binned.z_mid, binned["var"], p0=[0.02, 0])  # custom fit
-    ###binned.z_mid = binned.z_mid - Tcur/252*popt[0]**2/2  # correct for offset
-    fitted = qvar(binned.z_mid, popt[0], popt[1])    # use fit for whole data set
-    r2 = 1 - np.sum((binned["var"] - fitted)**2) / np.sum((binned["var"] - binned["var"].mean())**2)
-    print(f"T = {Tcur} σ₀ = {popt[0]:.4f}  zoff = {popt[1]:.4f}  R² = {r2:.4f}")
-    colcur = str(Tcur/100)
-    plt.plot(binned.z_mid, binned['var'], c=colcur, lw=2,label=f'T = {Tcur/5:.0f}, R² = {r2:.3f}') 
-    #plt.plot(binned.z_mid, binned['var'], c=colcur, lw=2,label=f'T = {Tcur/5:.0f}') 
-
-plt.xlabel('z (scaled log return)', fontsize=12)
-plt.ylabel('Annualised variance', fontsize=12)
-plt.legend(fontsize=10, loc='upper center')
-plt.grid(alpha=0.3)
-plt.title('All stocks T=2, 4, 8, 16 weeks – Q-Variance', fontsize=14)
-
-
-
-# now check for time-invariant distribution
-data = df_orig.copy()
-
-# Quantum density function — returns plain array for curve_fit
-def quantum_density(z, sig0, zoff=0.0):
-    ns = np.arange(0, 6)
-    qdn = np.zeros_like(z, dtype=float)
-    sigvec = sig0 * np.sqrt(2 * ns + 1)
-    means = zoff * np.ones_like(ns)  - sigvec**2/2 # no drift term in pure Q-Variance
-
-    for n in ns:
-        weight = poisson.pmf(n, mu=0.5)
-        qdn += weight * norm.pdf(z, loc=means[n], scale=sigvec[n])
-    return qdn
-
-# Plot setup
-zlim = 2
-zbins = np.linspace(-zlim, zlim, 51)
-zmid = (zbins[:-1] + zbins[1:]) / 2
-
-# Histogram
-counts, _ = np.histogram(data["z"], bins=zbins, density=True)
-
-# Fit quantum model
-p0 = [0.62, 0.0]  # initial guess: sig0 ≈ 0.62 → σ₀ ≈ 0.079 after √2 scaling
-popt, _ = curve_fit(quantum_density, zmid, counts, p0=p0, bounds=(0, [2.0, 0.5]))
-sig0_fit, zoff_fit = popt
-
-# Predict on fine grid
-z_fine = np.linspace(-zlim, zlim, 1000)
-q_pred_fine = quantum_density(z_fine, *popt)
-
-# Predict on histogram bin centers for R²
-q_pred_hist = quantum_density(zmid, *popt)
-r2 = r2_score(counts, q_pred_hist)
-
-print(f"Fit: σ₀ = {sig0_fit:.4f}, zoff = {zoff_fit:.4f}, R² = {r2:.4f}")
-
-# obtain histogram bars
-##counts, bin_edges, _ = plt.hist(data["z"], bins=zbins, density=True, visible=False)
+import numpy as np
+import pandas as pd
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dataset_io import load_dataset
+from binning import N_SEGMENTS, bin_stats, binned_curve, group_codes, key_codes, histogram, segment_codes, to_density
+from fitting import fit_qvar, r_squared
+from instrument import stage
+from sketch import Sketch, is_sketch, merge_sketches, read_sketch
 
+TARGET = (0.2586, 0.0214)      # σ₀ and zoff of the parabola fitted to the benchmark data
+TVEC = [5, 10, 20, 40, 80]     # periods compared in the T-dependence checks
 
-# now plot distn with periods
+ZMAX, DELZ = 0.6, 0.025*2                           # score bins, like (-0.6, -0.55]
+BINS = np.linspace(-ZMAX, ZMAX, int(2*ZMAX/DELZ + 1))
+WIDE_ZMAX, WIDE_DELZ = 1, 0.025*4                   # wider bins on a larger grid for the noisier per-ticker and per-T curves
+WIDE_BINS = np.linspace(-WIDE_ZMAX, WIDE_ZMAX, int(2*WIDE_ZMAX/WIDE_DELZ + 1))
+ZLIM = 2                                            # histogram of z for the time-invariance check
+ZBINS = np.linspace(-ZLIM, ZLIM, 51)
 
-TVEC = np.unique(data["T"])  # case where T=5 only gives TVEC=5
-if len(TVEC) > 1:
-    TVEC = [5, 10, 20, 40, 80]
 
+def qvar(z, s0, zoff):    # define q-variance function, parameter is minimal volatility s0 and zoff
+    return (s0**2 + (z - zoff)**2 / 2)
 
-plt.figure(figsize=(9,7))
-plt.plot(z_fine, q_pred_fine,
-         color='red', lw=4,
-         label=f'Q-Variance fit: σ₀ = {sig0_fit:.3f}, R² = {r2:.4f}')
 
-for Tcur in TVEC:
-    datacur = data[(data["T"] == Tcur)].copy()
-    counts, bin_edges, _ = plt.hist(datacur["z"], bins=zbins, density=True, visible=False)
-    r2 = r2_score(counts, q_pred_hist)    # use fit for whole data set
-    colcur = str(Tcur/(max(TVEC)+20))
-    #plt.plot(zmid, counts, c=colcur, lw=2,label=f'T = {Tcur/5:.0f}')  # , R² = {r2:.3f}' 
-    plt.plot(zmid, counts, c=colcur, lw=2,label=f'T = {Tcur/5:.0f}, R² = {r2:.3f}' )
+def qvar2(z, s0, s1):    # define q-variance function, parameter is minimal volatility s0 and qcoef
+    return (s0**2 + s1*z**2 )
 
-plt.title('Q-Variance: T dependence', fontsize=18, pad=20)
-plt.xlabel('Scaled log-return z', fontsize=14)
-plt.ylabel('Density', fontsize=14)
-plt.xlim(-1.2, 1.2)
-plt.legend(fontsize=10, loc='upper right')
-plt.grid(alpha=0.3)
-plt.tight_layout()
 
+def quantum_density(z, sig0, zoff=0.0):
+    """Poisson(0.5) mixture of normals with sigma sig0*sqrt(2n+1), n = 0..5, the q-variance density of z."""
+    z = np.asarray(z, dtype=float)
+    qdn = np.zeros_like(z)
+    for n in range(6):
+        weight = math.exp(-0.5) * 0.5**n / math.factorial(n)
+        sig = sig0 * math.sqrt(2*n + 1)
+        mean = zoff - sig**2/2              # no drift term in pure Q-Variance
+        qdn += weight * np.exp(-0.5*((z - mean)/sig)**2) / (sig*math.sqrt(2*math.pi))
+    return qdn
 
-plt.show()
 
+def r2_score(y, fitted):
+    """1 - SS_res/SS_tot, as sklearn.metrics.r2_score for one output."""
+    y = np.asarray(y, dtype=float)
+    return float(r_squared(y, np.asarray(fitted, dtype=float), np.ones_like(y)))
+
+
+@dataclass
+class ScoreReport:
+    """
+    Result of score(). The headline number is `r2`, the R² of the binned
+    curve against the target parabola. The bin statistics kept in the
+    *_stats fields are what score_plots.py draws from.
+    """
+    n_windows: int
+    n_nan: int
+    sigma0: float                 # target parabola the score is measured against
+    zoff: float
+    r2: float
+    curve: pd.DataFrame = field(repr=False)   # z_mid, var of the non-empty score bins
+
+    # per ticker, or per segment for model data
+    segmented: bool
+    groups: np.ndarray = field(repr=False)
+    group_fits: dict = field(repr=False)      # s0, zoff, r2, q0, q1 arrays from fitting.fit_qvar
+    group_stats: dict = field(repr=False)     # bin_stats on WIDE_BINS, shaped (ngroups, nbins)
+    group_r2_mean: float
+    group_r2_median: float
+
+    # q-variance per period T against the target parabola
+    r2_by_T: dict
+    T_stats: dict = field(repr=False)         # bin_stats on WIDE_BINS, shaped (len(TVEC), nbins)
+
+    # time invariance of the z distribution: quantum_density fitted to the histogram
+    dist_sigma0: float
+    dist_zoff: float
+    dist_r2: float
+    dist_r2_by_T: dict
+    hist: np.ndarray = field(repr=False)      # density on ZBINS
+    T_hist: np.ndarray = field(repr=False)    # density on ZBINS per period, shaped (len(dist_T), nbins)
+    dist_T: list = field(default_factory=list)
+
+    def to_dict(self):
+        """Plain summary for JSON: scalars, per-T scores and the per-group fits."""
+        def num(v):
+            v = float(v)
+            return v if math.isfinite(v) else None
+        return {
+            "n_windows": self.n_windows,
+            "n_nan": self.n_nan,
+            "sigma0": self.sigma0,
+            "zoff": self.zoff,
+            "r2": num(self.r2),
+            "segmented": self.segmented,
+            "n_groups": len(self.groups),
+            "group_r2_mean": num(self.group_r2_mean),
+            "group_r2_median": num(self.group_r2_median),
+            "r2_by_T": {str(T): num(v) for T, v in self.r2_by_T.items()},
+            "dist_sigma0": num(self.dist_sigma0),
+            "dist_zoff": num(self.dist_zoff),
+            "dist_r2": num(self.dist_r2),
+            "dist_r2_by_T": {str(T): num(v) for T, v in self.dist_r2_by_T.items()},
+            "groups": {"name": [str(g) for g in self.groups],
+                       **{k: [num(v) for v in self.group_fits[k]] for k in ("s0", "zoff", "r2", "q0", "q1")}},
+        }
+
+
+def read_dataset(paths=None, stats=None):
+    """
+    dataset.parquet in the current directory if there is one, else the benchmark
+    store; only the columns the score needs are read.
+    """
+    if not paths:
+        paths = "dataset.parquet" if os.path.isfile("dataset.parquet") else None
+    return load_dataset(paths, stats=stats, columns=["ticker", "T", "sigma", "z"])
+
+
+def fit_distribution(zmid, counts):
+    """Fit quantum_density to a histogram of z; returns sig0, zoff."""
+    from scipy.optimize import curve_fit   # only the distribution fit needs scipy
+    p0 = [0.62, 0.0]  # initial guess: sig0 ≈ 0.62 → σ₀ ≈ 0.079 after √2 scaling
+    popt, _ = curve_fit(quantum_density, zmid, counts, p0=p0, bounds=(0, [2.0, 0.5]))
+    return popt
+
+
+def _dist_periods(horizons):
+    dist_T = [int(t) for t in horizons]   # case where T=5 only gives [5]
+    return TVEC if len(dist_T) > 1 else dist_T
+
+
+def frame_stats(df, n_segments=N_SEGMENTS):
+    """Every bin statistic the score needs, from the rows of a dataset."""
+    z = df["z"].to_numpy(dtype=float)
+    var = df["sigma"].to_numpy(dtype=float)**2
+    T = df["T"].to_numpy()
+
+    segmented = df["ticker"].nunique() == 1
+    if segmented:
+        tick_codes, groups = segment_codes(len(df), n_segments)  # divide into segments treated as tickers
+    else:
+        tick_codes, groups = group_codes(df["ticker"])
+    dist_T = _dist_periods(np.unique(T))
+    return {
+        "n_windows": len(df), "n_nan": int(np.isnan(z).sum()),
+        "curve": bin_stats(z, var, BINS),
+        "segmented": segmented, "groups": groups,
+        "group_stats": bin_stats(z, var, WIDE_BINS, [tick_codes], [len(groups)]),
+        "T_stats": bin_stats(z, var, WIDE_BINS, [key_codes(T, TVEC)], [len(TVEC)]),   # -1 for periods not used
+        "hist": histogram(z, ZBINS),
+        "dist_T": dist_T,
+        "T_hist": histogram(z, ZBINS, key_codes(T, dist_T), len(dist_T)),
+    }
+
+
+def sketch_stats(sketch):
+    """The same statistics as frame_stats, from a sketch (sketch.py)."""
+    dist_T = _dist_periods(sketch.horizons)
+    return {
+        "n_windows": sketch.n_windows, "n_nan": sketch.n_nan,
+        "curve": sketch.bin_stats(BINS),
+        "segmented": sketch.segmented, "groups": sketch.groups,
+        "group_stats": sketch.bin_stats(WIDE_BINS, by="group"),
+        "T_stats": sketch.bin_stats(WIDE_BINS, by="T", keys=TVEC),
+        "hist": sketch.histogram(ZBINS),
+        "dist_T": dist_T,
+        "T_hist": sketch.histogram(ZBINS, by_T=dist_T),
+    }
+
+
+def score(dataset=None, n_segments=N_SEGMENTS, target=TARGET):
+    """
+    Score a dataset of windows (columns ticker, T, sigma, z).
+
+    dataset : DataFrame, parquet path or list of paths, or None for
+              dataset.parquet / the benchmark parts as read_dataset().
+              A Sketch, or sketch file(s) (merged), is scored from its bins.
+    n_segments : number of runs a single-ticker (model) dataset is divided into;
+              a sketch keeps the segments it was built with
+    target : (σ₀, zoff) of the parabola the binned curve is scored against
+
+    Returns a ScoreReport.
+    """
+    if isinstance(dataset, (str, os.PathLike)):
+        dataset = [dataset]
+    with stage("score/read"):
+        if isinstance(dataset, list) and dataset and all(is_sketch(p) for p in dataset):
+            dataset = merge_sketches(read_sketch(p) for p in dataset)
+        elif not isinstance(dataset, (Sketch, pd.DataFrame)):
+            dataset = read_dataset(dataset)
+
+    with stage("score/bin", rows=dataset.n_windows if isinstance(dataset, Sketch) else len(dataset)):
+        stats = sketch_stats(dataset) if isinstance(dataset, Sketch) else frame_stats(dataset, n_segments)
+
+    # per-bin count and sums with bins like (-0.6, -0.55], then z_mid = mean z and var = mean variance per bin
+    curve = binned_curve(**stats["curve"])
+    s0, zoff = target      # for competition score should fit original parabola
+    r2 = r2_score(curve["var"], qvar(curve.z_mid, s0, zoff))
+
+    # fit qvar and qvar2 to every ticker's (or segment's) binned curve at once (closed form, see fitting.py)
+    group_stats = stats["group_stats"]
+    with stage("score/fit", rows=len(stats["groups"])):
+        fits = fit_qvar(group_stats["count"], group_stats["sum_z"], group_stats["sum_var"])
+
+    # q-variance for different periods T against the target parabola, check for period-dependence
+    T_stats = stats["T_stats"]
+    r2_by_T = {}
+    for j, Tcur in enumerate(TVEC):
+        binned = binned_curve(T_stats["count"][j], T_stats["sum_z"][j], T_stats["sum_var"][j])
+        r2_by_T[Tcur] = r2_score(binned["var"], qvar(binned.z_mid, s0, zoff))
+
+    # now check for time-invariant distribution
+    zmid = (ZBINS[:-1] + ZBINS[1:]) / 2
+    hist = to_density(stats["hist"], ZBINS)
+    with stage("score/distribution"):
+        sig0_fit, zoff_fit = fit_distribution(zmid, hist)
+    q_pred_hist = quantum_density(zmid, sig0_fit, zoff_fit)
+    dist_T = stats["dist_T"]
+    T_hist = to_density(stats["T_hist"], ZBINS)
+
+    return ScoreReport(
+        n_windows=stats["n_windows"], n_nan=stats["n_nan"],
+        sigma0=s0, zoff=zoff, r2=r2, curve=curve,
+        segmented=stats["segmented"], groups=stats["groups"], group_fits=fits, group_stats=group_stats,
+        group_r2_mean=float(np.mean(fits["r2"])), group_r2_median=float(np.median(fits["r2"])),
+        r2_by_T=r2_by_T, T_stats=T_stats,
+        dist_sigma0=float(sig0_fit), dist_zoff=float(zoff_fit), dist_r2=r2_score(hist, q_pred_hist),
+        dist_r2_by_T={Tcur: r2_score(T_hist[j], q_pred_hist) for j, Tcur in enumerate(dist_T)},  # fit for whole data set
+        hist=hist, T_hist=T_hist, dist_T=dist_T,
+    )
+
+
+def print_report(report):
+    print(f"{report.n_windows} windows")
+    print(f"z has NaNs: {report.n_nan}")  # → 0
+    print(f"σ₀ = {report.sigma0:.4f}  zoff = {report.zoff:.4f}  R² = {report.r2:.4f}")
+    if report.segmented:
+        print(f"dividing into {len(report.groups)} separate runs")
+    else:
+        print("data already divided into separate tickers")
+    for Tcur, r2 in report.r2_by_T.items():
+        print(f"T = {Tcur} σ₀ = {report.sigma0:.4f}  zoff = {report.zoff:.4f}  R² = {r2:.4f}")
+    print(f"Fit: σ₀ = {report.dist_sigma0:.4f}, zoff = {report.dist_zoff:.4f}, R² = {report.dist_r2:.4f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a q-variance dataset against the target parabola")
+    parser.add_argument("paths", nargs="*",
+                        help="dataset parquet file(s) or sketch file(s) (default: dataset.parquet, else the benchmark store)")
+    parser.add_argument("--stats", help="z_raw stats table (default: the one stored with the dataset)")
+    parser.add_argument("--segments", type=int, default=N_SEGMENTS,
+                        help="runs a single-ticker dataset is divided into (default %(default)s)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON instead of text")
+    parser.add_argument("--plot", action=argparse.BooleanOptionalAction, default=None,
+                        help="draw the figures (default: on, off with --json)")
+    parser.add_argument("--save-figures", metavar="DIR",
+                        help="save the figures as PNG files in DIR instead of showing them")
+    args = parser.parse_args(argv)
+
+    if args.paths and all(is_sketch(p) for p in args.paths):
+        df = merge_sketches(read_sketch(p) for p in args.paths)   # no rows to draw, figure 1 shows the curves only
+    else:
+        df = read_dataset(args.paths, stats=args.stats)
+    report = score(df, n_segments=args.segments)
+
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=1))
+    else:
+        print_report(report)
+
+    plot = (not args.json) if args.plot is None else args.plot
+    if plot or args.save_figures:
+        from score_plots import plot_report
+        plot_report(report, df if isinstance(df, pd.DataFrame) else None,
+                    show=not args.save_figures, save_dir=args.save_figures)
+    return report
+
+
+if __name__ == "__main__":
+    main()
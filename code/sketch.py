@@ -0,0 +1,273 @@
+# sketch.py - mergeable q-variance sketch: binned sums instead of one row per window
+# the score only needs per-bin counts and sums of z and variance, split by ticker (or segment)
+# and T, so a sketch keeps exactly those on a fine z grid whose edges include every edge the
+# scorer uses. Sketches of different runs or tickers merge by adding cells.
+#   python code/sketch.py build dataset.parquet -o dataset.sketch.parquet
+#   python code/sketch.py merge a.sketch.parquet b.sketch.parquet -o ab.sketch.parquet
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from binning import N_SEGMENTS, bin_index, group_codes, key_codes, segment_codes
+
+
+
+def fine_edges(*grids):
+    """Sorted union of bin edge grids, with edges closer than 1e-9 counted once."""
+    edges = np.sort(np.concatenate(grids))
+    return edges[np.concatenate([[True], np.diff(edges) > 1e-9])]
+
+
+# 0.01 grid over [-2, 2], which holds the scorer's 0.1 and 0.08 wide bins, plus the edges of its
+# score bins: int(2*zmax/delz + 1) works out as 24 edges, so those are 1.2/23 wide
+FINE_EDGES = fine_edges(np.linspace(-2, 2, 401), np.linspace(-0.6, 0.6, 24))
+META_KEY = b"qvariance_sketch"
+SUMS = ["sum_z", "sum_var", "sum_z2", "sum_var2"]
+
+CELL_SCHEMA = pa.schema([
+    ("group", pa.int32()),     # index into Sketch.groups, -1 for rows outside every segment
+    ("T", pa.int16()),
+    ("bin", pa.int16()),       # fine bin (FINE_EDGES[b], FINE_EDGES[b+1]], -1 outside the grid
+    ("count", pa.int64()),
+    ("sum_z", pa.float64()),
+    ("sum_var", pa.float64()),
+    ("sum_z2", pa.float64()),   # sums of squares, for error bars on the binned means
+    ("sum_var2", pa.float64()),
+])
+
+
+def _cells(z, var, T, codes):
+    """Aggregate rows into (group, T, bin) cells: counts and sums per occupied cell."""
+    z = np.asarray(z, dtype=float)
+    var = np.asarray(var, dtype=float)
+    ok = ~np.isnan(z)
+    z, var = z[ok], var[ok]
+    T = np.asarray(T, dtype=np.int64)[ok]
+    g = np.asarray(codes, dtype=np.int64)[ok]
+    b = bin_index(z, FINE_EDGES).astype(np.int64)
+
+    key = ((g + 1) << 40) | (T << 16) | (b + 1)    # one int64 per cell, all parts non-negative
+    keys, inv = np.unique(key, return_inverse=True)
+    n = len(keys)
+    cells = {
+        "group": ((keys >> 40) - 1).astype(np.int32),
+        "T": ((keys >> 16) & 0xFFFFFF).astype(np.int16),
+        "bin": ((keys & 0xFFFF) - 1).astype(np.int16),
+        "count": np.bincount(inv, minlength=n),
+        "sum_z": np.bincount(inv, weights=z, minlength=n),
+        "sum_var": np.bincount(inv, weights=var, minlength=n),
+        "sum_z2": np.bincount(inv, weights=z*z, minlength=n),
+        "sum_var2": np.bincount(inv, weights=var*var, minlength=n),
+    }
+    return pd.DataFrame(cells), int((~ok).sum())
+
+
+def _combine(frames):
+    """Add up cell frames that may share keys."""
+    cells = pd.concat(frames, ignore_index=True)
+    cells = cells.groupby(["group", "T", "bin"], sort=True, as_index=False)[["count"] + SUMS].sum()
+    return cells.astype({"group": np.int32, "T": np.int16, "bin": np.int16})
+
+
+class Sketch:
+    """
+    Binned summary of a window dataset, enough to compute the score.
+
+    cells     : DataFrame of occupied (group, T, bin) cells with count,
+                sum_z, sum_var, sum_z2 and sum_var2
+    groups    : labels of the group codes (tickers, or V1.. segments)
+    segmented : True if the groups are row segments of a single-ticker dataset
+    n_nan     : windows with NaN z, which are in no cell
+
+    edges     : the fine z grid, bins (edges[b], edges[b+1]] as pd.cut
+
+    The sketch is built from de-meaned z, so the mean z of every (group, T)
+    is sum_z / count over its cells.
+    """
+
+    def __init__(self, cells, groups, segmented, n_nan=0, edges=FINE_EDGES):
+        self.cells = cells
+        self.edges = np.asarray(edges, dtype=float)
+        self.groups = np.asarray(groups)
+        self.segmented = bool(segmented)
+        self.n_nan = int(n_nan)
+
+    @classmethod
+    def from_arrays(cls, z, var, T, codes, groups, segmented):
+        cells, n_nan = _cells(z, var, T, codes)
+        return cls(cells, groups, segmented, n_nan)
+
+    @classmethod
+    def from_frame(cls, df, n_segments=N_SEGMENTS):
+        """Sketch of a dataset (ticker, T, sigma, z), grouped as score_submission.score groups it."""
+        segmented = df["ticker"].nunique() == 1
+        if segmented:
+            codes, groups = segment_codes(len(df), n_segments)
+        else:
+            codes, groups = group_codes(df["ticker"])
+        return cls.from_arrays(df["z"].to_numpy(dtype=float), df["sigma"].to_numpy(dtype=float)**2,
+                               df["T"].to_numpy(), codes, groups, segmented)
+
+    @property
+    def n_windows(self):
+        return int(self.cells["count"].sum()) + self.n_nan
+
+    @property
+    def horizons(self):
+        return [int(T) for T in np.unique(self.cells["T"])]
+
+    def _coarse(self, edges):
+        """Coarse bin of every fine bin, checking that the coarse edges are fine edges."""
+        edges = np.asarray(edges, dtype=float)
+        fine = self.edges
+        gap = np.abs(fine[np.abs(fine[:, None] - edges).argmin(axis=0)] - edges)
+        if gap.max() > 1e-9:
+            raise ValueError("bin edges are not on the sketch grid")
+        mid = (fine[:-1] + fine[1:]) / 2
+        return np.append(bin_index(mid, edges), -1)   # last entry: the outside cells (bin == -1)
+
+    def bin_stats(self, edges, by=None, keys=None, squares=False):
+        """
+        Count, sum of z and sum of variance per bin of `edges`, as binning.bin_stats
+        on the original rows. by=None gives one curve, by="group" one per group and
+        by="T" one per period in `keys`. squares=True adds sum_z2 and sum_var2.
+        """
+        nb = len(edges) - 1
+        c = self.cells
+        coarse = self._coarse(edges)[c["bin"].to_numpy()]   # bin -1 picks the last entry
+        keep = coarse >= 0
+        if by is None:
+            size, codes = 1, np.zeros(len(c), dtype=np.int64)
+        elif by == "group":
+            size, codes = len(self.groups), c["group"].to_numpy().astype(np.int64)
+        elif by == "T":
+            size, codes = len(keys), key_codes(c["T"].to_numpy(), keys)
+        else:
+            raise ValueError(f"by must be None, 'group' or 'T', not {by!r}")
+        keep &= codes >= 0
+        flat = codes[keep] * nb + coarse[keep]
+
+        cols = ["count", "sum_z", "sum_var"] + (["sum_z2", "sum_var2"] if squares else [])
+        shape = (nb,) if by is None else (size, nb)
+        out = {k: np.bincount(flat, weights=c[k].to_numpy()[keep], minlength=size*nb).reshape(shape) for k in cols}
+        out["count"] = out["count"].round().astype(np.int64)
+        return out
+
+    def histogram(self, edges, by_T=None):
+        """Window counts per bin of `edges`, optionally one row per period in by_T."""
+        if by_T is None:
+            return self.bin_stats(edges)["count"].astype(float)
+        return self.bin_stats(edges, by="T", keys=by_T)["count"].astype(float)
+
+    def write(self, path):
+        meta = {"edges": self.edges.tolist(),
+                "groups": [str(g) for g in self.groups], "segmented": self.segmented, "n_nan": self.n_nan}
+        table = pa.Table.from_pandas(self.cells, schema=CELL_SCHEMA, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), META_KEY: json.dumps(meta)})
+        pq.write_table(table, path, compression="zstd")
+
+
+class SketchBuilder:
+    """
+    Builds a sketch from rows that arrive in order, e.g. while a loader writes
+    them. For a single-ticker dataset pass the final number of rows so segments
+    are cut exactly as score_submission does on the written file.
+    """
+
+    def __init__(self, n_rows=None, n_segments=N_SEGMENTS, groups=None):
+        if groups is None and n_rows is None:
+            raise ValueError("segmenting a single-ticker dataset needs the final number of rows")
+        self.segmented = groups is None
+        self.n_rows = n_rows
+        self.n_segments = n_segments
+        self.groups = segment_codes(0, n_segments)[1] if groups is None else np.asarray(groups)
+        self.rows = 0
+        self.frames = []
+        self.n_nan = 0
+
+    def add(self, z, var, T, codes=None):
+        n = len(z)
+        if codes is None:   # segments from the row position
+            codes = segment_codes(self.n_rows, self.n_segments, self.rows, self.rows + n)[0]
+        cells, n_nan = _cells(z, var, T, codes)
+        self.frames.append(cells)
+        self.n_nan += n_nan
+        self.rows += n
+        if len(self.frames) >= 64:    # keep memory bounded by the number of occupied cells
+            self.frames = [_combine(self.frames)]
+
+    def finish(self):
+        cells = _combine(self.frames) if self.frames else _combine([_cells([], [], [], [])[0]])
+        return Sketch(cells, self.groups, self.segmented, self.n_nan)
+
+
+def is_sketch(path):
+    """True for a parquet file written by Sketch.write."""
+    try:
+        meta = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return META_KEY in meta
+
+
+def read_sketch(path):
+    table = pq.read_table(path)
+    meta = json.loads(table.schema.metadata[META_KEY])
+    return Sketch(table.to_pandas(), meta["groups"], meta["segmented"], meta["n_nan"], meta["edges"])
+
+
+def merge_sketches(sketches):
+    """
+    One sketch holding all windows of the inputs. Groups with the same label
+    (the same ticker) are added together; the segments of separate runs stay
+    separate, run i's segments following run i-1's (V1..V500, V501..V1000, ...),
+    so the per-segment scores are those of every run's own segments.
+    """
+    sketches = list(sketches)
+    if any(not np.array_equal(s.edges, sketches[0].edges) for s in sketches):
+        raise ValueError("sketches with different z grids cannot be merged")
+    segmented = all(s.segmented for s in sketches)
+    if segmented:
+        offsets = np.cumsum([0] + [len(s.groups) for s in sketches])
+        groups = np.array([f"V{i}" for i in range(1, offsets[-1] + 1)])
+        remaps = [np.append(np.arange(len(s.groups)) + k, -1) for s, k in zip(sketches, offsets)]
+    else:
+        groups = np.sort(pd.unique(np.concatenate([s.groups for s in sketches]).astype(str)))   # as group_codes
+        index = pd.Index(groups)
+        remaps = [np.append(index.get_indexer(s.groups.astype(str)), -1) for s in sketches]
+    frames = [s.cells.assign(group=remap[s.cells["group"].to_numpy()].astype(np.int32))   # code -1 stays -1
+              for s, remap in zip(sketches, remaps)]
+    return Sketch(_combine(frames), groups, segmented, sum(s.n_nan for s in sketches),
+                  sketches[0].edges)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or merge q-variance sketches")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="sketch a window dataset")
+    build.add_argument("paths", nargs="*", help="dataset file(s) or store (default: as score_submission.py)")
+    build.add_argument("--segments", type=int, default=N_SEGMENTS)
+    build.add_argument("-o", "--output", required=True)
+    merge = sub.add_parser("merge", help="merge sketches")
+    merge.add_argument("paths", nargs="+")
+    merge.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        from score_submission import read_dataset
+        sketch = Sketch.from_frame(read_dataset(args.paths), args.segments)
+    else:
+        sketch = merge_sketches(read_sketch(p) for p in args.paths)
+    sketch.write(args.output)
+    print(f"{sketch.n_windows} windows in {len(sketch.cells)} cells → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
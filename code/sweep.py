@@ -0,0 +1,223 @@
+# sweep.py - how much does each model parameter move the score? runs a grid of parameter values
+# on a process pool and caches every simulated path and its window sketch under a hash of
+# (model source, parameters, seed, n_days), so rerunning a sweep with one more grid point only
+# simulates that point.
+#   python code/sweep.py cir_poisson --base sigma0=0.25 --vary sigma0=0.2,0.25,0.3 kappa=0.25,0.5,1 --n-days 100000
+#   python code/sweep.py "path/to/model.py:simulate" --vary sigma0=0.2,0.3     # any function returning prices
+#   table = sweep(model, grid({"sigma0": [0.2, 0.3], "kappa": [0.5, 1]}), n_days=100_000)
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from models import MODELS, get_model, load_object, parse_params, simulate, source_hash
+from pipeline import run_pipeline
+from score_submission import score
+from sketch import read_sketch
+from windowing import HORIZONS
+
+CACHE_DIR = ".sweep_cache"
+
+
+def resolve_model(model):
+    """
+    A model callable from a callable or a "file.py:function" / "module:function"
+    string (see models.load_object); strings also travel to worker processes
+    where a local function cannot.
+    """
+    if callable(model):
+        return model
+    return load_object(model)
+
+
+def model_id(model):
+    """
+    Name and source hash of a model (a registered name, see models.py, or as
+    resolve_model): editing the model's file gives new cache keys.
+    """
+    if model in MODELS:
+        return f"models.{model}", source_hash(model)
+    fn = resolve_model(model)
+    name = f"{getattr(fn, '__module__', '')}.{getattr(fn, '__qualname__', repr(fn))}"
+    try:
+        source = Path(inspect.getsourcefile(fn)).read_bytes()
+    except (TypeError, OSError):
+        source = name.encode()
+    return name, hashlib.sha256(source).hexdigest()[:16]
+
+
+def cache_key(model, params, seed, n_days, **extra):
+    """Content address of one simulation (plus e.g. the windowing settings in `extra`)."""
+    name, source = model_id(model)
+    spec = {"model": name, "source": source, "params": params, "seed": seed, "n_days": n_days, **extra}
+    blob = json.dumps(spec, sort_keys=True, default=lambda v: v.item() if hasattr(v, "item") else str(v))
+    return hashlib.sha256(blob.encode()).hexdigest()[:24]
+
+
+def model_defaults(model):
+    """
+    Default parameter values of a model: the dataclass fields of a registered
+    model, the keyword defaults of a callable.
+    """
+    if model in MODELS:
+        return get_model(model).params()
+    params = inspect.signature(resolve_model(model)).parameters.values()
+    return {p.name: p.default for p in params
+            if p.default is not inspect.Parameter.empty and p.name not in ("n_days", "seed")}
+
+
+def grid(axes):
+    """Every combination of the values in a {name: [values]} dict, as a list of parameter dicts."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[n] for n in names))]
+
+
+def one_at_a_time(base, axes):
+    """
+    The base parameters, and each parameter of `axes` varied over its values
+    with the rest at base. Every parameter of `axes` needs a base value (see
+    model_defaults), or the base point could not be told apart from the others.
+    """
+    missing = [name for name in axes if name not in base]
+    if missing:
+        raise ValueError(f"no base value for {', '.join(missing)}")
+    points = [dict(base)]
+    for name, values in axes.items():
+        points += [{**base, name: v} for v in values if v != base.get(name)]
+    return points
+
+
+def simulate_returns(model, params, seed, n_days):
+    """
+    Daily log returns of one model run. A registered model runs through
+    models.simulate; any other model is called as model(**params,
+    n_days=n_days, seed=seed) and returns prices (or a tuple starting with them).
+    """
+    if model in MODELS:
+        return np.concatenate(list(simulate(model, n_days, seed, **params)))
+    out = resolve_model(model)(**params, n_days=n_days, seed=seed)
+    prices = out[0] if isinstance(out, tuple) else out
+    return np.diff(np.log(np.asarray(prices, dtype=float)))
+
+
+def _write(table, path):
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)           # a half-written file never has the final name
+
+
+def run_point(model, params, seed, n_days, cache_dir=CACHE_DIR, stride=None, horizons=HORIZONS):
+    """
+    Score one parameter point, reusing the cached sketch or path if there is one.
+    Returns the parameters, the scores and which cache level was hit.
+    """
+    cache = Path(cache_dir)
+    cache.mkdir(parents=True, exist_ok=True)
+    key = cache_key(model, params, seed, n_days)
+    path_file = cache / f"{key}.returns.parquet"
+    sketch_file = cache / f"{cache_key(model, params, seed, n_days, stride=stride, horizons=list(map(int, horizons)))}.sketch.parquet"
+
+    if sketch_file.exists():
+        sketch, hit = read_sketch(sketch_file), "sketch"
+    else:
+        if path_file.exists():
+            ret, hit = pq.read_table(path_file).column("ret").to_numpy(), "path"
+        else:
+            ret, hit = simulate_returns(model, params, seed, n_days), "no"
+            _write(pa.table({"ret": ret}), path_file)
+        sketch = run_pipeline([ret], horizons, stride).sketch
+        tmp = sketch_file.with_suffix(".tmp")
+        sketch.write(tmp)
+        os.replace(tmp, sketch_file)
+
+    report = score(sketch)
+    return {**params, "seed": seed, "n_days": n_days, "n_windows": report.n_windows,
+            "r2": report.r2, **{f"r2_T{T}": r2 for T, r2 in report.r2_by_T.items()},
+            "group_r2_mean": report.group_r2_mean, "group_r2_median": report.group_r2_median,
+            "dist_sigma0": report.dist_sigma0, "dist_r2": report.dist_r2, "cached": hit}
+
+
+def _run(job):
+    return run_point(*job)
+
+
+def sweep(model, points, seeds=(0,), n_days=100_000, cache_dir=CACHE_DIR, workers=None, stride=None):
+    """
+    Simulate and score `model` at every parameter dict in `points` (see grid
+    and one_at_a_time) for every seed, on `workers` processes (None: all
+    cores, 1: in this process). `model` is a registered model name
+    (models.py), a callable defined at module level or a "file.py:function"
+    string; see simulate_returns. Returns one row per (point, seed).
+    """
+    jobs = [(model, dict(p), s, n_days, cache_dir, stride) for p in points for s in seeds]
+    if workers == 1:
+        rows = list(map(_run, jobs))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            rows = list(pool.map(_run, jobs))
+    return pd.DataFrame(rows)
+
+
+def sensitivity(table, names, base=None, column="r2"):
+    """
+    Spread of `column` over the values of each parameter: a parameter that
+    moves the score is free. With `base` (a one_at_a_time sweep) only the rows
+    with the other parameters at their base values count.
+    """
+    rows = []
+    for name in names:
+        sel = table
+        for other in names:
+            if base is not None and other != name and other in base:
+                sel = sel[sel[other] == base[other]]
+        by = sel.groupby(name)[column].mean()
+        rows.append({"parameter": name, "values": len(by), "min": by.min(), "max": by.max(), "spread": by.max() - by.min()})
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sensitivity sweep with a cache of simulated paths")
+    parser.add_argument("model", help='registered model name (models.py), or "file.py:function" returning prices')
+    parser.add_argument("--base", nargs="*", metavar="NAME=VALUE", help="parameters held fixed")
+    parser.add_argument("--vary", nargs="*", metavar="NAME=V1,V2", help="parameters to sweep")
+    parser.add_argument("--product", action="store_true", help="full grid of --vary values (default: one at a time)")
+    parser.add_argument("--n-days", type=int, default=100_000)
+    parser.add_argument("--seeds", type=int, nargs="*", default=[0])
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--cache", default=CACHE_DIR, help="cache directory (default %(default)s)")
+    parser.add_argument("--csv", help="write the table to this CSV file")
+    args = parser.parse_args(argv)
+
+    base = parse_params(args.base)
+    axes = {k: v if isinstance(v, list) else [v] for k, v in parse_params(args.vary).items()}
+    defaults = model_defaults(args.model)
+    for name in axes:                    # varied parameters left out of --base sit at the model default
+        if name not in base and name in defaults:
+            base[name] = defaults[name]
+    if not args.product:
+        missing = [name for name in axes if name not in base]
+        if missing:
+            parser.error(f"no default for {', '.join(missing)}, give it in --base")
+    points = [{**base, **p} for p in grid(axes)] if args.product else one_at_a_time(base, axes)
+    table = sweep(args.model, points, args.seeds, args.n_days, args.cache, args.workers)
+    with pd.option_context("display.width", 200, "display.max_columns", 30):
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        print()
+        print(sensitivity(table, list(axes), None if args.product else base).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+
+
+if __name__ == "__main__":
+    main()
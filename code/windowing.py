@@ -0,0 +1,172 @@
+# windowing.py - window statistics (x, sigma, z_raw) for all horizons from prefix sums
+# shared by data_loader.py and code/data_loader_csv.py, replaces the per-window while loops
+import numpy as np
+
+HORIZONS = 5*(np.arange(26)+1)   # does 1 to 26 weeks, can also do [5, 10, 20, 40, 80, 160]
+SCALE = np.sqrt(252)             # annualise daily std
+
+
+def prefix_sums(ret):
+    """
+    Cumulative sums of a return series, each of length len(ret)+1, so that any
+    window [i, j) is summarised by s[j] - s[i] in O(1).
+
+    Returns are centred on their overall mean before accumulating, which keeps
+    the difference of squared sums well away from cancellation. Non-finite
+    returns are zeroed in the sums and counted in `nbad` so that windows which
+    contain them can be rejected, and `nchg` counts value changes so that
+    constant windows (sigma exactly 0 in np.std) are detected exactly.
+
+    Returns
+    -------
+    s1, s2 : ndarray
+        Cumulative sums of centred returns and of their squares.
+    nbad : ndarray
+        Cumulative count of non-finite returns.
+    nchg : ndarray
+        Cumulative count of positions k with ret[k] != ret[k-1].
+    shift : float
+        Mean that was subtracted from the finite returns.
+    """
+    ret = np.asarray(ret, dtype=float).ravel()
+    good = np.isfinite(ret)
+    shift = ret[good].mean() if good.any() else 0.0
+    c = np.where(good, ret - shift, 0.0)
+
+    s1 = np.zeros(len(ret) + 1)
+    s2 = np.zeros(len(ret) + 1)
+    np.cumsum(c, out=s1[1:])
+    np.cumsum(c*c, out=s2[1:])
+
+    nbad = np.zeros(len(ret) + 1, dtype=np.int64)
+    np.cumsum(~good, out=nbad[1:])
+
+    nchg = np.zeros(len(ret) + 1, dtype=np.int64)
+    if len(ret) > 1:
+        np.cumsum(ret[1:] != ret[:-1], out=nchg[2:])
+    return s1, s2, nbad, nchg, shift
+
+
+def empty_windows():
+    """Window columns with no rows."""
+    return {"end": np.zeros(0, dtype=np.int64), "T": np.zeros(0, dtype=np.int64),
+            "z_raw": np.zeros(0), "sigma": np.zeros(0)}
+
+
+def window_block(sums, starts, T):
+    """
+    x, sigma and z_raw for windows ret[starts:starts+T] of one horizon T.
+
+    `sums` is the tuple returned by prefix_sums. `ok` flags the windows the
+    original loaders keep: finite, with sigma > 0.
+    """
+    s1, s2, nbad, nchg, shift = sums
+    ends = starts + T
+
+    d1 = s1[ends] - s1[starts]
+    d2 = s2[ends] - s2[starts]
+    x = d1 + T*shift                                  # total price change over the period
+    var = np.maximum(d2/T - (d1/T)**2, 0.0)           # population variance, ddof=0 as np.std
+    var[nchg[ends] - nchg[starts + 1] == 0] = 0.0     # constant window has exactly zero std
+    sigma = np.sqrt(var) * SCALE
+    z_raw = x / np.sqrt(T / 252.0)
+
+    # REJECT BAD WINDOWS
+    ok = (nbad[ends] == nbad[starts]) & np.isfinite(z_raw) & np.isfinite(sigma) & (sigma > 0)
+    return x, sigma, z_raw, ok
+
+
+def iter_windows(ret, horizons=HORIZONS, stride=None, chunk_rows=1_000_000, sums=None):
+    """
+    Yield accepted windows as dicts of columnar arrays (see window_stats), in
+    order of T and then window start, with at most `chunk_rows` candidate
+    windows per chunk so memory stays bounded for overlapping windows.
+
+    stride : int or None
+        Step between window starts in days. None gives non-overlapping windows
+        (a step of T, as the original loaders), 1 gives every sliding window.
+    """
+    ret = np.asarray(ret, dtype=float).ravel()
+    if sums is None:
+        sums = prefix_sums(ret)
+
+    for T in horizons:
+        T = int(T)
+        step = T if stride is None else int(stride)
+        n_win = max(len(ret) - T + step, 0) // step      # starts 0, step, ... with start + T <= len(ret)
+        for first in range(0, n_win, chunk_rows):
+            starts = step * np.arange(first, min(first + chunk_rows, n_win), dtype=np.int64)
+            _, sigma, z_raw, ok = window_block(sums, starts, T)
+            yield {
+                "end": starts[ok] + T - 1,
+                "T": np.full(ok.sum(), T, dtype=np.int64),
+                "z_raw": z_raw[ok],
+                "sigma": sigma[ok],
+            }
+
+
+def window_stats(ret, horizons=HORIZONS, stride=None):
+    """
+    Windows of length T for every T in `horizons`, starting from the first
+    return in steps of `stride` (default T, matching the loaders' original
+    non-overlapping while loops).
+
+    Returns a dict of columnar arrays, rows ordered by T and then window start:
+        end   : index of the last return in the window (i + T - 1)
+        T     : horizon in days
+        z_raw : x / sqrt(T/252), not yet de-meaned
+        sigma : annualised std of daily returns over the window
+    """
+    chunks = list(iter_windows(ret, horizons, stride, chunk_rows=np.iinfo(np.int64).max))
+    if not chunks:
+        return empty_windows()
+    return {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
+
+
+class WindowStream:
+    """
+    Incremental version of iter_windows for returns that arrive in chunks.
+
+    push() takes the next block of returns and gives back every window that
+    ends inside it, carrying the last few returns over so windows that straddle
+    a chunk boundary are not lost. Only max(T) + stride returns are kept
+    between calls, so memory does not grow with the length of the series.
+    Window positions (`end`) are global indices into the full return series.
+    """
+
+    def __init__(self, horizons=HORIZONS, stride=None):
+        self.horizons = [int(T) for T in horizons]
+        self.stride = stride
+        self.carry = np.zeros(0)                          # returns not yet covered by every T
+        self.offset = 0                                   # global index of carry[0]
+        self.next_start = {T: 0 for T in self.horizons}   # next window start for each T
+
+    def push(self, ret):
+        ret = np.asarray(ret, dtype=float).ravel()
+        buf = np.concatenate([self.carry, ret])
+        end_pos = self.offset + len(buf)
+        sums = prefix_sums(buf)
+
+        ends, Ts, z_raws, sigmas = [], [], [], []
+        for T in self.horizons:
+            step = T if self.stride is None else int(self.stride)
+            first = self.next_start[T]
+            if first + T > end_pos:
+                continue
+            n = (end_pos - T - first) // step + 1
+            starts = first + step * np.arange(n, dtype=np.int64)
+            _, sigma, z_raw, ok = window_block(sums, starts - self.offset, T)
+            ends.append(starts[ok] + T - 1)
+            Ts.append(np.full(ok.sum(), T, dtype=np.int64))
+            z_raws.append(z_raw[ok])
+            sigmas.append(sigma[ok])
+            self.next_start[T] = first + n * step
+
+        keep = min(min(self.next_start.values()), end_pos)
+        self.carry = buf[keep - self.offset:].copy()
+        self.offset = keep
+
+        if not ends:
+            return empty_windows()
+        return {"end": np.concatenate(ends), "T": np.concatenate(Ts),
+                "z_raw": np.concatenate(z_raws), "sigma": np.concatenate(sigmas)}
@@ -1,83 +1,155 @@
 # data_loader.py - read price data for stocks in S&P 500 and save a parquet file
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from datetime import timedelta
+import argparse
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent / "code"))
+from windowing import window_stats
+from price_sources import YFinanceSource, LocalDirectorySource, CachedSource, fetch_prices
+from dataset_io import DATASET_DIR, window_sums, merge_sums, write_partitioned, load_dataset
+from sketch import Sketch
+from instrument import stage, traced
 
 HORIZONS = 5*(np.arange(26)+1)   # does 1 to 26 weeks, can also do [5, 10, 20, 40, 80, 160]
 
-# from R: l.out <- BatchGetSymbols(tickers=tickers,first.date=as.Date('1950-01-01'),last.date=as.Date('2025-12-03'),thresh.bad.data=0.25)# stocks with at least 0.25 of dates since 1950, so about 19 years of data
-TICKERS = ["MMM", "AOS", "ABT", "ACN", "ADBE", "AMD", "AES", "AFL", "A", "APD", "AKAM", "ALB", "ARE",              "ALGN", "LNT", "ALL", "GOOGL", "GOOG", "MO", "AMZN", "AEE", "AEP", "AXP", "AIG", "AMT",              "AMP", "AME", "AMGN", "APH", "ADI", "AON", "APA", "AAPL", "AMAT", "ACGL", "ADM", "AJG",              "AIZ", "T", "ATO", "ADSK", "ADP", "AZO", "AVB", "AVY", "AXON", "BKR", "BALL", "BAC", "BAX",              "BDX", "BBY", "TECH", "BIIB", "BLK", "BK", "BA", "BKNG", "BSX", "BMY", "BRO", "BLDR", "BG",              "BXP", "CHRW", "CDNS", "CPT", "CPB", "COF", "CAH", "CCL", "CAT", "CBRE", "COR", "CNC", "CNP",              "CF", "CRL" , "SCHW", "CVX", "CMG", "CB", "CHD", "CI", "CINF", "CTAS", "CSCO", "C", "CLX",              "CME", "CMS" , "KO", "CTSH", "CL", "CMCSA", "CAG", "COP", "ED", "STZ", "COO", "CPRT", "GLW",              "CSGP", "COST", "CTRA", "CCI", "CSX", "CMI", "CVS", "DHR", "DRI", "DVA", "DECK", "DE", "DVN",              "DXCM", "DLR", "DLTR", "D", "DPZ", "DOV", "DHI", "DTE", "DUK", "DD", "ETN", "EBAY", "ECL",              "EIX", "EW", "EA", "ELV", "EME", "EMR", "ETR", "EOG", "EQT", "EFX", "EQIX", "EQR", "ERIE",              "ESS", "EL", "EG", "EVRG", "ES", "EXC", "EXPE", "EXPD", "EXR", "XOM", "FFIV", "FDS", "FICO",              "FAST", "FRT", "FDX", "FIS", "FITB", "FSLR", "FE", "FISV", "F", "BEN", "FCX", "GRMN", "IT",              "GE", "GEN", "GD", "GIS", "GPC", "GILD", "GPN", "GL", "GS", "HAL", "HIG", "HAS", "DOC",              "HSIC", "HSY", "HOLX", "HD", "HON", "HRL", "HST", "HPQ", "HUBB", "HUM", "HBAN", "IBM", "IEX",              "IDXX", "ITW", "INCY", "INTC", "ICE", "IFF", "IP", "INTU", "ISRG", "IVZ", "IRM", "JBHT", "JBL",              "JKHY", "J", "JNJ", "JCI", "JPM", "K", "KEY", "KMB", "KIM", "KLAC", "KR", "LHX", "LH", "LRCX",              "LVS", "LDOS", "LEN", "LII", "LLY", "LIN", "LYV", "LKQ", "LMT", "L", "LOW", "MTB", "MAR",              "MMC", "MLM", "MAS", "MA", "MTCH", "MKC", "MCD", "MCK", "MDT", "MRK", "MET", "MTD", "MGM",              "MCHP", "MU", "MSFT", "MAA", "MHK", "MOH", "TAP", "MDLZ", "MPWR", "MNST", "MCO", "MS", "MOS",              "MSI", "NDAQ", "NTAP", "NFLX", "NEM", "NEE", "NKE", "NI", "NDSN", "NSC", "NTRS", "NOC", "NRG",              "NUE", "NVDA", "NVR", "ORLY", "OXY", "ODFL", "OMC", "ON", "OKE", "ORCL", "PCAR", "PKG",              "PSKY", "PH", "PAYX", "PNR", "PEP", "PFE", "PCG", "PNW", "PNC", "POOL", "PPG", "PPL", "PFG",              "PG", "PGR", "PLD", "PRU", "PEG", "PTC", "PSA", "PHM", "PWR", "QCOM", "DGX", "RL", "RJF",              "RTX", "O", "REG", "REGN", "RF", "RSG", "RMD", "RVTY", "ROK", "ROL", "ROP", "ROST", "RCL",              "SPGI", "CRM", "SBAC", "SLB", "STX", "SRE", "SHW", "SPG", "SWKS", "SJM", "SNA", "SO", "LUV",              "SWK", "SBUX", "STT", "STLD", "STE", "SYK", "SNPS", "SYY", "TROW", "TTWO", "TPR", "TGT",              "TDY", "TER", "TXN", "TPL", "TXT", "TMO", "TJX", "TKO", "TSCO", "TT", "TDG", "TRV", "TRMB",              "TFC", "TYL", "TSN", "USB", "UDR", "UNP", "UAL", "UPS", "URI", "UNH", "UHS", "VLO", "VTR",              "VRSN", "VZ", "VRTX", "VTRS", "VMC", "WRB", "GWW", "WAB", "WMT", "DIS", "WBD", "WM", "WAT",              "WEC", "WFC", "WELL", "WST", "WDC", "WY", "WSM", "WMB", "WTW", "WYNN", "XEL", "YUM", "ZBRA", "ZBH"]
-ntick = len(TICKERS)
+# from R: l.out <- BatchGetSymbols(tickers=tickers,first.date=as.Date('1950-01-01'),last.date=as.Date('2025-12-03'),thresh.bad.data=0.25)
+# stocks with at least 0.25 of dates since 1950, so about 19 years of data
+TICKERS = ["MMM", "AOS", "ABT", "ACN", "ADBE", "AMD", "AES", "AFL", "A", "APD", "AKAM", "ALB", "ARE", 
+             "ALGN", "LNT", "ALL", "GOOGL", "GOOG", "MO", "AMZN", "AEE", "AEP", "AXP", "AIG", "AMT", 
+             "AMP", "AME", "AMGN", "APH", "ADI", "AON", "APA", "AAPL", "AMAT", "ACGL", "ADM", "AJG", 
+             "AIZ", "T", "ATO", "ADSK", "ADP", "AZO", "AVB", "AVY", "AXON", "BKR", "BALL", "BAC", "BAX", 
+             "BDX", "BBY", "TECH", "BIIB", "BLK", "BK", "BA", "BKNG", "BSX", "BMY", "BRO", "BLDR", "BG", 
+             "BXP", "CHRW", "CDNS", "CPT", "CPB", "COF", "CAH", "CCL", "CAT", "CBRE", "COR", "CNC", "CNP", 
+             "CF", "CRL" , "SCHW", "CVX", "CMG", "CB", "CHD", "CI", "CINF", "CTAS", "CSCO", "C", "CLX", 
+             "CME", "CMS" , "KO", "CTSH", "CL", "CMCSA", "CAG", "COP", "ED", "STZ", "COO", "CPRT", "GLW", 
+             "CSGP", "COST", "CTRA", "CCI", "CSX", "CMI", "CVS", "DHR", "DRI", "DVA", "DECK", "DE", "DVN", 
+             "DXCM", "DLR", "DLTR", "D", "DPZ", "DOV", "DHI", "DTE", "DUK", "DD", "ETN", "EBAY", "ECL", 
+             "EIX", "EW", "EA", "ELV", "EME", "EMR", "ETR", "EOG", "EQT", "EFX", "EQIX", "EQR", "ERIE", 
+             "ESS", "EL", "EG", "EVRG", "ES", "EXC", "EXPE", "EXPD", "EXR", "XOM", "FFIV", "FDS", "FICO", 
+             "FAST", "FRT", "FDX", "FIS", "FITB", "FSLR", "FE", "FISV", "F", "BEN", "FCX", "GRMN", "IT", 
+             "GE", "GEN", "GD", "GIS", "GPC", "GILD", "GPN", "GL", "GS", "HAL", "HIG", "HAS", "DOC", 
+             "HSIC", "HSY", "HOLX", "HD", "HON", "HRL", "HST", "HPQ", "HUBB", "HUM", "HBAN", "IBM", "IEX", 
+             "IDXX", "ITW", "INCY", "INTC", "ICE", "IFF", "IP", "INTU", "ISRG", "IVZ", "IRM", "JBHT", "JBL", 
+             "JKHY", "J", "JNJ", "JCI", "JPM", "K", "KEY", "KMB", "KIM", "KLAC", "KR", "LHX", "LH", "LRCX", 
+             "LVS", "LDOS", "LEN", "LII", "LLY", "LIN", "LYV", "LKQ", "LMT", "L", "LOW", "MTB", "MAR", 
+             "MMC", "MLM", "MAS", "MA", "MTCH", "MKC", "MCD", "MCK", "MDT", "MRK", "MET", "MTD", "MGM", 
+             "MCHP", "MU", "MSFT", "MAA", "MHK", "MOH", "TAP", "MDLZ", "MPWR", "MNST", "MCO", "MS", "MOS", 
+             "MSI", "NDAQ", "NTAP", "NFLX", "NEM", "NEE", "NKE", "NI", "NDSN", "NSC", "NTRS", "NOC", "NRG", 
+             "NUE", "NVDA", "NVR", "ORLY", "OXY", "ODFL", "OMC", "ON", "OKE", "ORCL", "PCAR", "PKG", 
+             "PSKY", "PH", "PAYX", "PNR", "PEP", "PFE", "PCG", "PNW", "PNC", "POOL", "PPG", "PPL", "PFG", 
+             "PG", "PGR", "PLD", "PRU", "PEG", "PTC", "PSA", "PHM", "PWR", "QCOM", "DGX", "RL", "RJF", 
+             "RTX", "O", "REG", "REGN", "RF", "RSG", "RMD", "RVTY", "ROK", "ROL", "ROP", "ROST", "RCL", 
+             "SPGI", "CRM", "SBAC", "SLB", "STX", "SRE", "SHW", "SPG", "SWKS", "SJM", "SNA", "SO", "LUV", 
+             "SWK", "SBUX", "STT", "STLD", "STE", "SYK", "SNPS", "SYY", "TROW", "TTWO", "TPR", "TGT", 
+             "TDY", "TER", "TXN", "TPL", "TXT", "TMO", "TJX", "TKO", "TSCO", "TT", "TDG", "TRV", "TRMB", 
+             "TFC", "TYL", "TSN", "USB", "UDR", "UNP", "UAL", "UPS", "URI", "UNH", "UHS", "VLO", "VTR", 
+             "VRSN", "VZ", "VRTX", "VTRS", "VMC", "WRB", "GWW", "WAB", "WMT", "DIS", "WBD", "WM", "WAT", 
+             "WEC", "WFC", "WELL", "WST", "WDC", "WY", "WSM", "WMB", "WTW", "WYNN", "XEL", "YUM", "ZBRA", "ZBH"]
+
+parser = argparse.ArgumentParser(description="Build the q-variance benchmark dataset")
+parser.add_argument("--source", default="yfinance",
+                    help="'yfinance' or a directory of <ticker>.csv/.parquet price files (offline)")
+parser.add_argument("--cache", default="cache", help="per-ticker price cache directory ('' to disable)")
+parser.add_argument("--max-age-days", type=float, default=1.0, help="refetch cached prices older than this")
+parser.add_argument("--workers", type=int, default=16, help="parallel downloads")
+parser.add_argument("--update", action="store_true",
+                    help="append only windows newer than the existing dataset instead of rebuilding it")
+parser.add_argument("--output", default=DATASET_DIR, help="partitioned dataset directory (one T=<T> folder per period)")
+parser.add_argument("--sketch", metavar="PATH", help="also write a q-variance sketch of the whole dataset (see code/sketch.py)")
+parser.add_argument("--tickers", nargs="+", help="tickers to load instead of the S&P 500 list above")
+parser.add_argument("--tickers-file", help="file with the tickers to load, one per line")
+args = parser.parse_args()
+
+tickers = TICKERS
+if args.tickers_file:
+    tickers = Path(args.tickers_file).read_text().split()
+if args.tickers:
+    tickers = args.tickers
+tickers = list(dict.fromkeys(tickers))   # each ticker once
+ntick = len(tickers)
+TICKER_DTYPE = pd.CategoricalDtype(tickers)   # ticker codes instead of a string on every row
+
+root = Path(args.output)
+stats_path = root / "_stats.parquet"
+
+# with --update, the stats table says where each (ticker, T) ended last time
+if args.update and not stats_path.exists():
+    parser.error(f"--update needs an existing dataset in {root}; run without --update first")
+old_stats = pd.read_parquet(stats_path) if args.update else None
+
+source = YFinanceSource() if args.source == "yfinance" else LocalDirectorySource(args.source)
+if args.cache:
+    source = CachedSource(source, args.cache, timedelta(days=args.max_age_days))
 
-# Path("cache").mkdir(exist_ok=True)
 all_data = []
 
 print("Generating Q-Variance Challenge Dataset...")
 
-for ticker in TICKERS:
+fetched = traced("fetch", fetch_prices(tickers, source, args.workers), rows=lambda item: len(item[1]) if item[1] is not None else 0)
+for ticker, price, err in fetched:   # downloads run ahead in a thread pool, "fetch" is the wait for the next one
     print(f"→ {ticker}", end="")
-    price = yf.download(ticker, period="max", progress=False, auto_adjust=True)["Close"]
-    
+    if price is None:
+        print(f" [fetch failed: {err}]")
+        continue
+
     ret = np.log(price).diff().dropna().values
 
-    rows = []
-    scale = np.sqrt(252)
-
-    for T in HORIZONS:
-        i = 0
-        while i + T <= len(ret):
-            window = ret[i:i+T]     # T points
-            if len(window) < T * 0.8:
-                break
-
-            x = window.sum()   # total price change over the period
-            sigma = np.std(window, ddof=0) * scale  # use np.std to get std over period, ddof=1 means divisor is N-1
-            z_raw = x / np.sqrt(T / 252.0)
-
-            # REJECT BAD WINDOWS
-            if not (np.isfinite(sigma) and sigma > 0 and np.isfinite(z_raw)):
-                i += T
-                continue
-
-            rows.append({          # append row of data for this period
-                "ticker": ticker,
-                "date": price.index[i + T - 1].date(),
-                "T": T,
-                "z_raw": float(z_raw),
-                "sigma": float(sigma)
-            })
-            i += T
-
-    if not rows:
+    with stage("window") as rec:
+        cols = window_stats(ret, HORIZONS)   # columnar x/sigma/z_raw for every T, see code/windowing.py
+        rec.rows = len(cols["T"])
+    df = pd.DataFrame({          # one row of data per period
+        "ticker": pd.Categorical.from_codes(np.full(len(cols["T"]), tickers.index(ticker)), dtype=TICKER_DTYPE),
+        "date": price.index[cols["end"]].normalize(),
+        "T": cols["T"].astype(np.int16),
+        "z_raw": cols["z_raw"],
+        "sigma": cols["sigma"]
+    })
+
+    if df.empty:
         print(" [no data]")
         continue
 
-    df = pd.DataFrame(rows)
-
     # CLEAN BEFORE DE-MEANING 
     df = df[np.isfinite(df['z_raw']) & np.isfinite(df['sigma']) & (df['sigma'] > 0)]
 
-    # NOW de-mean safely, this step groups by ticker and T, and subtracts the group mean 
-    df["z"] = df.groupby(["ticker", "T"])["z_raw"].transform(lambda g: g - g.mean())
+    if old_stats is not None:   # keep only windows ending after the last stored one for this ticker and T
+        last = old_stats[old_stats["ticker"] == ticker].set_index("T")["last"]
+        df = df[df["date"] > df["T"].map(last).fillna(pd.Timestamp.min)]
 
-    df = df.drop(columns="z_raw")
+    # de-meaning is deferred to read time (dataset_io.load_dataset): we store z_raw plus the
+    # per (ticker, T) count and sum of z_raw, so appending windows never touches old rows
     df = df.dropna().reset_index(drop=True)  # Final clean
 
-    #df.to_parquet(Path("cache") / f"{ticker}.parquet")
     print(f" → {len(df)} clean windows")
     all_data.append(df)
 
-full = pd.concat(all_data, ignore_index=True)
-
-n = len(full) // 3
-part1 = full.iloc[:n]
-part2 = full.iloc[n:2*n]
-part3 = full.iloc[2*n:]
-
-# Save 3 small files
-part1.to_parquet("dataset_part1.parquet", compression=None)
-part2.to_parquet("dataset_part2.parquet", compression=None)
-part3.to_parquet("dataset_part3.parquet", compression=None)
-
-print("Done! 3 files created — each <25 MB")
+if not all_data:   # every fetch failed or was too short for a window
+    sys.exit("no prices fetched for any ticker, nothing written")
+
+with stage("concat"):
+    full = pd.concat(all_data, ignore_index=True)
+    stats = window_sums(full)
+
+if args.update:
+    if full.empty:
+        print("Done! dataset already up to date")
+        sys.exit()
+    name = f"part{len({p.stem.split('-')[0] for p in root.glob('T=*/*.parquet')})}"   # next unused file name
+    with stage("write", rows=len(full)):
+        write_partitioned(full, root, name=name, replace=False)
+    merge_sums(old_stats, stats).to_parquet(stats_path)
+    print(f"Done! {len(full)} new windows appended to {root} as {name}-*.parquet")
+else:
+    # one directory per T, zstd with column statistics, plus the stats used to de-mean z_raw when reading
+    with stage("write", rows=len(full)):
+        write_partitioned(full, root)
+        stats.to_parquet(stats_path)
+    print(f"Done! {len(full)} windows written to {root}/ in {full['T'].nunique()} partitions")
+
+if args.sketch:   # binned sums of the de-meaned dataset, old and new windows alike
+    with stage("sketch"):
+        Sketch.from_frame(load_dataset(root, columns=["ticker", "T", "sigma", "z"])).write(args.sketch)
+    print(f"Sketch written to {args.sketch}")
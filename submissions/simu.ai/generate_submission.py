@@ -2,16 +2,15 @@
 Generate submission for Q-Variance Challenge
 
 This script:
-1. Simulates price data using the regime mixture Q-variance model
-2. Processes the CSV through data_loader_csv.py to generate dataset.parquet
-3. Scores the submission using score_submission.py
+1. Simulates price data using the regime mixture Q-variance model, chunk by chunk
+2. Windows the chunks as they arrive (code/pipeline.py) into dataset.parquet and a q-variance sketch
+3. Scores the sketch in-process with score_submission.score()
 """
 import os
 os.environ["MPLBACKEND"] = "Agg"  
 
 
 import sys
-import subprocess
 import numpy as np
 import pandas as pd
 from pathlib import Path
@@ -30,13 +29,15 @@ from sklearn.metrics import r2_score
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 sys.path.insert(0, str(Path(__file__).parent.parent.parent / 'code'))
 
-from model_simulation import generate_price_csv
+from model_simulation import RegimeMixtureSimulator, iter_regime_mixture_parallel
+from pipeline import log_returns, run_pipeline, write_price_csv
+from score_submission import score, print_report
+from density_plot import density_scatter
+from instrument import report, stage, traced
 
 # Configuration
 SUBMISSION_DIR = Path(__file__).parent
 CHALLENGE_ROOT = Path(__file__).parent.parent.parent
-DATA_LOADER_SCRIPT = CHALLENGE_ROOT / 'code' / 'data_loader_csv.py'
-SCORE_SCRIPT = CHALLENGE_ROOT / 'code' / 'score_submission.py'
 
 # Model parameters for regime mixture Q-variance model
 # Based on the model structure: σ²(z) = σ₀² + (z - z₀)²/2
@@ -46,6 +47,10 @@ MU = 0.023182         # Drift per year (z₀)
 N_DAYS = 5_000_000    # Number of trading days to simulate
 SAMPLES_PER_DAY = 4   # Internal steps per day for simulation granularity
 MAX_WINDOW_DAYS = 130 # Maximum window size in days (for regime length heuristic)
+CHUNK_DAYS = 250_000  # Days simulated and windowed at a time
+SAVE_CSV = False      # Also write the price path to variance_timeseries.csv (for data_loader_csv.py)
+BLOCK_DAYS = None     # e.g. 50_000: simulate in blocks of this many days on all cores (a different draw)
+WORKERS = None        # processes for BLOCK_DAYS (None: all cores); the path does not depend on it
 
 # Note: The model uses regime-switching variance with Gamma-distributed precision
 # Regime lengths are geometric with mean ≈ 10 * max_window_days
@@ -72,12 +77,13 @@ def quantum_density(z, sig0, zoff=0.0):
 def generate_figures(dataset_path, output_dir):
     """Generate Figure_1.png and Figure_5.png for the submission"""
     print(f"Loading dataset from {dataset_path}...")
-    data = pd.read_parquet(dataset_path)
+    with stage("figures/read"):
+        data = pd.read_parquet(dataset_path)
     data["var"] = data.sigma**2
     
     print(f"Loaded {len(data)} windows")
     
-    # ===== Figure 1: Q-Variance scatter plot =====
+    # ===== Figure 1: Q-Variance density plot =====
     print("Generating Figure_1.png...")
     
     zmax = 0.6
@@ -86,22 +92,24 @@ def generate_figures(dataset_path, output_dir):
     bins = np.linspace(-zmax, zmax, nbins)
     
     # Create binned data
-    binned = (data.assign(z_bin=pd.cut(data.z, bins=bins, include_lowest=True))
-                   .groupby('z_bin', observed=False)
-                   .agg(z_mid=('z', 'mean'), var=('var', 'mean'))
-                   .dropna())
+    with stage("figures/pd.cut", rows=len(data)):
+        binned = (data.assign(z_bin=pd.cut(data.z, bins=bins, include_lowest=True))
+                       .groupby('z_bin', observed=False)
+                       .agg(z_mid=('z', 'mean'), var=('var', 'mean'))
+                       .dropna())
     
     # Fit q-variance curve
-    popt, _ = curve_fit(qvar, binned.z_mid, binned["var"], p0=[0.25, 0.02])
+    with stage("figures/curve_fit"):
+        popt, _ = curve_fit(qvar, binned.z_mid, binned["var"], p0=[0.25, 0.02])
     fitted = qvar(binned.z_mid, popt[0], popt[1])
     r2 = 1 - np.sum((binned["var"] - fitted)**2) / np.sum((binned["var"] - binned["var"].mean())**2)
     
     print(f"  σ₀ = {popt[0]:.4f}  zoff = {popt[1]:.4f}  R² = {r2:.4f}")
     
     # Plot
-    markfac = 1
     plt.figure(figsize=(9, 7))
-    plt.scatter(data.z, data['var'], c='steelblue', alpha=markfac*0.1, s=markfac*1, edgecolor='none')
+    with stage("figures/density_scatter", rows=len(data)):
+        density_scatter(plt.gca(), data.z, data['var'], (-zmax, zmax), (0.0, 0.35), color='steelblue')
     plt.plot(binned.z_mid, binned['var'], 'b-', lw=3, label='Binned data')
     plt.plot(binned.z_mid, fitted, 'red', lw=3, 
              label=f'σ₀ = {popt[0]:.3f}, zoff = {popt[1]:.3f}, R² = {r2:.3f}')
@@ -116,7 +124,8 @@ def generate_figures(dataset_path, output_dir):
     plt.tight_layout()
     
     figure1_path = output_dir / 'Figure_1.png'
-    plt.savefig(figure1_path, dpi=300, bbox_inches='tight')
+    with stage("savefig"):
+        plt.savefig(figure1_path, dpi=300, bbox_inches='tight')
     plt.close('all')  # Close all figures
     print(f"  Saved to {figure1_path}")
     
@@ -132,7 +141,8 @@ def generate_figures(dataset_path, output_dir):
     
     # Fit quantum model
     p0 = [0.62, 0.0]
-    popt_q, _ = curve_fit(quantum_density, zmid, counts, p0=p0, bounds=(0, [2.0, 0.5]))
+    with stage("figures/curve_fit"):
+        popt_q, _ = curve_fit(quantum_density, zmid, counts, p0=p0, bounds=(0, [2.0, 0.5]))
     sig0_fit, zoff_fit = popt_q
     
     # Predict on fine grid
@@ -171,42 +181,12 @@ def generate_figures(dataset_path, output_dir):
     plt.tight_layout()
     
     figure5_path = output_dir / 'Figure_5.png'
-    plt.savefig(figure5_path, dpi=300, bbox_inches='tight')
+    with stage("savefig"):
+        plt.savefig(figure5_path, dpi=300, bbox_inches='tight')
     plt.close('all')  # Close all figures
     print(f"  Saved to {figure5_path}")
 
 
-def run_data_loader():
-    """Run data_loader_csv.py to process the CSV and generate dataset.parquet"""
-    print("\n" + "="*60)
-    print("Step 2: Processing CSV through data_loader_csv.py")
-    print("="*60)
-    
-    # Change to challenge root directory
-    os.chdir(CHALLENGE_ROOT)
-    
-    # The data_loader_csv.py expects variance_timeseries.csv in the current directory
-    # and will create dataset.parquet
-    result = subprocess.run(
-        [sys.executable, str(DATA_LOADER_SCRIPT)],
-        capture_output=True,
-        text=True
-    )
-    
-    print(result.stdout)
-    if result.stderr:
-        print("Errors:", result.stderr)
-    
-    # Move dataset.parquet to submission directory
-    dataset_file = CHALLENGE_ROOT / 'dataset.parquet'
-    if dataset_file.exists():
-        target = SUBMISSION_DIR / 'dataset.parquet'
-        dataset_file.rename(target)
-        print(f"\nMoved dataset.parquet to {target}")
-    else:
-        print("Warning: dataset.parquet was not created")
-
-
 def main():
     """Main execution function"""
     print("="*60)
@@ -222,56 +202,44 @@ def main():
     print(f"Simulating {N_DAYS:,} days (~{N_DAYS/252:.1f} years)")
     print(f"Samples per day: {SAMPLES_PER_DAY}, Max window: {MAX_WINDOW_DAYS} days")
     
-    # Generate CSV in challenge root (where data_loader_csv.py expects it)
-    csv_file = CHALLENGE_ROOT / 'variance_timeseries.csv'
-    generate_price_csv(
-        sigma0=SIGMA0,
-        mu=MU,
-        n_days=N_DAYS,
-        samples_per_day=SAMPLES_PER_DAY,
-        max_window_days=MAX_WINDOW_DAYS,
-        output_file=str(csv_file),
-        seed=42  # For reproducibility
-    )
-    
-    # Step 2: Process through data_loader_csv.py
-    run_data_loader()
-    
+    if BLOCK_DAYS is None:
+        sim = RegimeMixtureSimulator(
+            sigma0=SIGMA0,
+            mu=MU,
+            n_days=N_DAYS,
+            samples_per_day=SAMPLES_PER_DAY,
+            max_window_days=MAX_WINDOW_DAYS,
+            seed=42  # For reproducibility
+        )
+        log_prices = traced("simulate", sim.iter_log_prices(CHUNK_DAYS))
+    else:
+        print(f"Block-parallel: {BLOCK_DAYS:,} days per block, {WORKERS or 'all'} workers")
+        blocks = iter_regime_mixture_parallel(SIGMA0, MU, N_DAYS, SAMPLES_PER_DAY, max_window_days=MAX_WINDOW_DAYS,
+                                              seed=42, block_days=BLOCK_DAYS, workers=WORKERS)
+        log_prices = traced("simulate", (L for L, _ in blocks))
+    if SAVE_CSV:
+        log_prices = write_price_csv(log_prices, CHALLENGE_ROOT / 'variance_timeseries.csv')
+
+    # Step 2: Window the chunks as they are simulated
+    print("\n" + "="*60)
+    print("Step 2: Computing windows")
+    print("="*60)
+    dataset_file = SUBMISSION_DIR / 'dataset.parquet'
+    result = run_pipeline(log_returns(log_prices), output=dataset_file)
+    print(f" → {result.nrows} clean windows")
+    print(f"Saved to {dataset_file}")
+
     # Step 3: Score the submission
     print("\n" + "="*60)
     print("Step 3: Scoring submission")
     print("="*60)
-    
-    # Modify score_submission.py temporarily to read from submission directory
-    # Or copy dataset.parquet to challenge root for scoring
-    dataset_file = SUBMISSION_DIR / 'dataset.parquet'
-    if dataset_file.exists():
-        # Copy to challenge root for scoring
-        import shutil
-        temp_dataset = CHALLENGE_ROOT / 'dataset.parquet'
-        shutil.copy(dataset_file, temp_dataset)
-        
-        # Run scoring
-        os.chdir(CHALLENGE_ROOT)
-        result = subprocess.run(
-            [sys.executable, str(SCORE_SCRIPT)],
-            capture_output=True,
-            text=True
-        )
-        
-        print(result.stdout)
-        if result.stderr:
-            print("Errors:", result.stderr)
-        
-        # Clean up temp file
-        if temp_dataset.exists():
-            temp_dataset.unlink()
+    print_report(score(result.sketch))
     
     # Step 4: Generate figures
     print("\n" + "="*60)
     print("Step 4: Generating figures")
     print("="*60)
-    generate_figures(SUBMISSION_DIR / 'dataset.parquet', SUBMISSION_DIR)
+    generate_figures(dataset_file, SUBMISSION_DIR)
     
     print("\n" + "="*60)
     print("Submission generation complete!")
@@ -283,6 +251,12 @@ def main():
     print(f"  - {SUBMISSION_DIR / 'Figure_1.png'}")
     print(f"  - {SUBMISSION_DIR / 'Figure_5.png'}")
 
+    # where the time went (QVAR_TRACE=trace.json also writes every stage, see code/instrument.py)
+    print("\n" + "="*60)
+    print("Time per stage")
+    print("="*60)
+    report()
+
 
 if __name__ == '__main__':
     main()
@@ -12,8 +12,14 @@ Model:
 Parameters: (σ₀, μ, n_days, samples_per_day)
 """
 
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
+from scipy.signal import lfilter
 
 
 def simulate_regime_mixture_qvar(
@@ -25,6 +31,7 @@ def simulate_regime_mixture_qvar(
     max_window_days=None,
     mean_reversion_rate=0.001,
     seed=None,
+    daily=False,
 ):
     """
     Long log-price path with piecewise-constant variance regimes.
@@ -62,7 +69,15 @@ def simulate_regime_mixture_qvar(
         Mean reversion rate per year (default: 0.001, giving half-life ≈ 693 days).
         Set to 0.0 to disable mean reversion. We apply mean reversion to prevent
         overflow errors when exponentiating long log-price paths.
-    seed : int or None
+    seed : int, numpy Generator or None
+    daily : bool
+        Draw one Gaussian increment per day from the regime boundaries instead
+        of one per internal step. Within a day the steps of each regime add up
+        to a Gaussian whose mean and variance are sums over the regime pieces
+        (geometric sums under mean reversion), so the daily path has exactly the
+        same distribution while time and memory scale with days and regimes,
+        not with n_days * samples_per_day. The random stream differs, so the
+        path for a given seed is not the same as with daily=False.
 
     Returns
     -------
@@ -74,12 +89,16 @@ def simulate_regime_mixture_qvar(
         Average variance rate per day (mean of internal V over that day).
     """
 
-    rng = np.random.default_rng(seed)
+    sim = RegimeMixtureSimulator(sigma0, mu, n_days, samples_per_day, mean_regime_length_days,
+                                 max_window_days, mean_reversion_rate, seed, daily)
+    L_daily, V_daily = sim.next_chunk(n_days)
+    prices_daily = np.exp(L_daily)
+
+    return prices_daily, L_daily, V_daily
 
-    # --- internal grid ---
-    dt_step = 1.0 / (252.0 * samples_per_day)          # year fraction per internal step
-    n_steps = n_days * samples_per_day
 
+def switch_probability(samples_per_day, mean_regime_length_days=None, max_window_days=None):
+    """Per-step regime switch probability (geometric hazard) for a mean regime length in days."""
     # heuristic for mean regime length if not provided
     if mean_regime_length_days is None:
         if max_window_days is not None:
@@ -90,64 +109,323 @@ def simulate_regime_mixture_qvar(
             mean_regime_length_days = 2000.0
 
     mean_regime_length_steps = mean_regime_length_days * samples_per_day
-    p_switch = 1.0 / mean_regime_length_steps  # geometric hazard
+    return 1.0 / mean_regime_length_steps
 
-    # paths on internal grid
-    L = np.zeros(n_steps + 1)
-    V_path = np.zeros(n_steps)
 
-    # Gamma parameters for precision tau
-    alpha = 3/2                      # shape
-    beta = sigma0**2                 # rate
-    # tau ~ Gamma(alpha, rate=beta) => in numpy: scale=1/beta
-    tau = rng.gamma(shape=alpha, scale=1.0 / beta)
-    V = 1.0 / tau
+class RegimeMixtureSimulator:
+    """
+    The regime mixture path of `simulate_regime_mixture_qvar`, produced a
+    block of days at a time so that long paths never have to be held in memory.
 
-    # drift per internal step
-    mu_step = mu * dt_step
-    
-    # We apply mean reversion to prevent overflow errors when exponentiating long log-price paths
-    # Mean reversion rate per internal step
-    theta_step = mean_reversion_rate * dt_step
+    Random numbers are drawn in the same order as the one-shot simulation (a
+    regime's whole block of normals when the regime starts), so the
+    concatenated chunks are the same path for a given seed however the days
+    are split between calls. Parameters as `simulate_regime_mixture_qvar`.
+
+    Each regime is evaluated as a whole: a cumulative sum without mean
+    reversion (the same bits as stepping one by one), otherwise a linear AR(1)
+    filter, which differs from stepping by rounding only (daily returns agree
+    to ~1e-13; 5e6 days × 4 steps take about a second instead of half a minute).
+
+    With daily=True no internal step is simulated: regimes come from one
+    random stream and the daily normals from another (both spawned from
+    `seed`), so chunking still leaves the path unchanged.
+    """
+
+    def __init__(self, sigma0, mu=0.0, n_days=5_000_000, samples_per_day=4,
+                 mean_regime_length_days=None, max_window_days=None,
+                 mean_reversion_rate=0.001, seed=None, daily=False):
+        self.daily = daily
+        if daily:
+            # a seed or a Generator; default_rng(seed).spawn gives the streams of SeedSequence(seed).spawn
+            self.rng, self.day_rng = np.random.default_rng(seed).spawn(2)
+        else:
+            self.rng = np.random.default_rng(seed)
+        self.n_days = n_days
+        self.samples_per_day = samples_per_day
+
+        # --- internal grid ---
+        self.dt_step = 1.0 / (252.0 * samples_per_day)    # year fraction per internal step
+        self.n_steps = n_days * samples_per_day
+
+        self.p_switch = switch_probability(samples_per_day, mean_regime_length_days, max_window_days)
+
+        # Gamma parameters for precision tau
+        self.alpha = 3/2                  # shape
+        self.beta = sigma0**2             # rate
+        # tau ~ Gamma(alpha, rate=beta) => in numpy: scale=1/beta
+        tau = self.rng.gamma(shape=self.alpha, scale=1.0 / self.beta)
+        self.V = 1.0 / tau
+
+        # drift per internal step
+        self.mu_step = mu * self.dt_step
+
+        # We apply mean reversion to prevent overflow errors when exponentiating long log-price paths
+        # Mean reversion rate per internal step
+        self.theta_step = mean_reversion_rate * self.dt_step
+
+        self.t = 0                    # internal steps simulated so far
+        self.L = 0.0                  # log-price after step t
+        self.eps = np.zeros(0)        # normals of the current regime ...
+        self.pos = 0                  # ... of which eps[:pos] are used
+        self.regime_end = None        # daily mode: internal step at which the current regime ends
+
+    @property
+    def days_done(self):
+        return self.t // self.samples_per_day
+
+    def next_chunk(self, n_days):
+        """
+        Simulate the next `n_days` days (fewer at the end of the path).
+
+        Returns
+        -------
+        log_prices_daily : ndarray, shape (n+1,)
+            Log-price at the start of the chunk and at the end of each day.
+        V_daily : ndarray, shape (n,)
+            Average variance rate per day.
+        """
+        n_days = max(min(n_days, self.n_days - self.days_done), 0)
+        if self.daily:
+            return self._next_days(n_days)
+        steps = n_days * self.samples_per_day
+        L = np.zeros(steps + 1)
+        V_path = np.zeros(steps)
+        L[0] = self.L
+        sd = np.sqrt(self.V * self.dt_step)
+
+        k = 0
+        while k < steps:
+            if self.pos == len(self.eps):
+                if self.t > 0:
+                    # new regime: resample tau, hence V
+                    tau = self.rng.gamma(shape=self.alpha, scale=1.0 / self.beta)
+                    self.V = 1.0 / tau
+                # sample regime length in internal steps
+                L_reg = self.rng.geometric(self.p_switch)
+                L_reg = min(L_reg, self.n_steps - self.t)
+                # simulate this regime
+                self.eps = self.rng.standard_normal(L_reg)
+                self.pos = 0
+                sd = np.sqrt(self.V * self.dt_step)
+
+            m = min(len(self.eps) - self.pos, steps - k)
+            drive = self.mu_step + sd * self.eps[self.pos:self.pos + m]
+            if self.theta_step == 0.0:
+                # random walk: a running sum, bit-for-bit the step-by-step recursion
+                np.cumsum(np.concatenate([[L[k]], drive]), out=L[k:k+m+1])
+            else:
+                # Mean reversion term -theta * L[t] * dt pulls log-price toward zero, which makes
+                # L[t+1] = (1 - theta) L[t] + drive[t] an AR(1) filter over the regime
+                a = 1.0 - self.theta_step
+                L[k+1:k+m+1] = lfilter([1.0], [1.0, -a], drive, zi=[a * L[k]])[0]
+            V_path[k:k+m] = self.V
+            k += m
+            self.pos += m
+            self.t += m
+
+        self.L = L[-1]
+
+        # --- downsample to one value per *day* ---
+        step = self.samples_per_day
+        L_daily = L[::step]                    # length n_days+1
+        # daily average variance over internal steps
+        V_daily = V_path.reshape(n_days, step).mean(axis=1) if step > 1 else V_path
+        return L_daily, V_daily
+
+    def _next_days(self, n_days):
+        """next_chunk for daily=True: one Gaussian per day, summed over the regime pieces."""
+        S = self.samples_per_day
+        t0, t1 = self.t, self.t + n_days * S
+
+        # regimes that cover internal steps [t0, t1), drawn in the same order as stepping does
+        if self.regime_end is None:
+            self.regime_end = self.rng.geometric(self.p_switch)
+        starts, Vs = [t0], [self.V]
+        while self.regime_end < t1:
+            tau = self.rng.gamma(shape=self.alpha, scale=1.0 / self.beta)
+            self.V = 1.0 / tau
+            starts.append(self.regime_end)
+            Vs.append(self.V)
+            self.regime_end += self.rng.geometric(self.p_switch)
+        starts, Vs = np.array(starts, dtype=np.int64), np.array(Vs)
+
+        # cut [t0, t1) at day ends and regime changes: piece i is steps [cuts[i], cuts[i+1])
+        cuts = np.union1d(t0 + S * np.arange(n_days + 1, dtype=np.int64), starts)
+        m = np.diff(cuts).astype(float)
+        day = (cuts[:-1] - t0) // S
+        V = Vs[np.searchsorted(starts, cuts[:-1], side='right') - 1]
+        r = (t0 + S * (day + 1) - cuts[1:]).astype(float)     # steps left in the day after the piece
+
+        # with a = 1 - theta, L(day end) = a^S L(day start) + sum over pieces of
+        #   a^r (mu_step (1 - a^m) / (1 - a) + N(0, V dt (1 - a^2m) / (1 - a^2)))
+        theta = self.theta_step
+        if theta == 0.0:
+            mean, var, A = self.mu_step * m, V * self.dt_step * m, 1.0
+        else:
+            la = np.log1p(-theta)
+            mean = self.mu_step * np.exp(r * la) * -np.expm1(m * la) / theta
+            var = V * self.dt_step * np.exp(2 * r * la) * -np.expm1(2 * m * la) / (theta * (2 - theta))
+            A = np.exp(S * la)
+        drift = np.bincount(day, weights=mean, minlength=n_days)
+        sd = np.sqrt(np.bincount(day, weights=var, minlength=n_days))
+        drive = drift + sd * self.day_rng.standard_normal(n_days)
+
+        if theta == 0.0:
+            L = np.cumsum(np.concatenate([[self.L], drive]))
+        else:
+            L = np.concatenate([[self.L], lfilter([1.0], [1.0, -A], drive, zi=[A * self.L])[0]])
+        V_daily = np.bincount(day, weights=V * m, minlength=n_days) / S
+
+        self.t = t1
+        self.L = L[-1]
+        return L, V_daily
+
+    def next_log_prices(self, n_days):
+        """
+        The daily log-prices of the next `n_days` days; the first call also
+        returns the initial log-price, so successive calls concatenate to the
+        log_prices_daily of `simulate_regime_mixture_qvar`.
+        """
+        first = self.t == 0
+        L_daily, _ = self.next_chunk(n_days)
+        return L_daily if first else L_daily[1:]
+
+    def iter_log_prices(self, chunk_days=250_000):
+        """Yield next_log_prices in chunks of `chunk_days` days until the path is done."""
+        while self.days_done < self.n_days:
+            yield self.next_log_prices(chunk_days)
+
+    def iter_returns(self, chunk_days=250_000):
+        """Yield daily log returns of the path, `chunk_days` at a time."""
+        while self.days_done < self.n_days:
+            L_daily, _ = self.next_chunk(chunk_days)
+            yield np.diff(L_daily)
 
-    remaining = n_steps
-    t = 0
-    while remaining > 0:
-        # sample regime length in internal steps
-        L_reg = rng.geometric(p_switch)
-        L_reg = min(L_reg, remaining)
-
-        # simulate this regime
-        eps = rng.standard_normal(L_reg)
-        
-        # Apply mean reversion step-by-step (can't use cumsum due to L dependency)
-        for i in range(L_reg):
-            # Mean reversion term: -theta * L[t] * dt pulls log-price toward zero
-            dL_i = mu_step - theta_step * L[t] + np.sqrt(V * dt_step) * eps[i]
-            L[t+1] = L[t] + dL_i
-            V_path[t] = V
-            t += 1
-
-        remaining -= L_reg
-
-        if remaining > 0:
-            # new regime: resample tau, hence V
-            tau = rng.gamma(shape=alpha, scale=1.0 / beta)
-            V = 1.0 / tau
-
-    # --- downsample to one value per *day* ---
-    step = samples_per_day
-    L_daily = L[::step]                    # length n_days+1
-    prices_daily = np.exp(L_daily)
 
-    # daily average variance over internal steps
-    if samples_per_day > 1:
-        n_days_eff = len(L_daily) - 1      # should be n_days
-        V_daily = V_path[:n_days_eff*step].reshape(n_days_eff, step).mean(axis=1)
+# --- block-parallel simulation ---------------------------------------------------------------
+# Regime switches are memoryless (geometric lengths), and the log-price is linear in its start
+# value and in the variance of the regime running into a block. So a block of days can be
+# simulated from its own random stream without knowing where the previous block ended: the
+# worker returns the block's path from L = 0 with the running-in regime at unit variance kept
+# apart, and the latent state (that regime's V and the log-price) is stitched on serially.
+
+def _regime_block(job):
+    """Simulate one block of days from its own seed; see simulate_regime_mixture_parallel."""
+    seed, first, n_days, S, p_switch, alpha, beta, dt_step, mu_step, theta_step = job
+    rng = np.random.default_rng(seed)
+    steps = n_days * S
+
+    # steps [0, carry) continue the regime running into the block, unless this is the first block.
+    # Given that it has lasted so far, it ends at each step boundary with probability p_switch.
+    carry = 0 if first else rng.geometric(p_switch) - 1
+    starts, Vs = [], []
+    t = carry
+    while t < steps:
+        Vs.append(1.0 / rng.gamma(shape=alpha, scale=1.0 / beta))
+        starts.append(t)
+        t += rng.geometric(p_switch)
+    eps = rng.standard_normal(steps)
+
+    carry = min(carry, steps)
+    V_step = np.zeros(steps)
+    if starts:
+        lengths = np.diff(np.append(starts, steps))
+        V_step[carry:] = np.repeat(Vs, lengths)
+    unit = np.zeros(steps)
+    unit[:carry] = np.sqrt(dt_step) * eps[:carry]           # running-in regime at V = 1
+    known = mu_step + np.sqrt(V_step * dt_step) * eps       # sqrt(0) leaves only the drift there
+
+    if theta_step == 0.0:
+        R_unit, R_known = np.cumsum(unit), np.cumsum(known)
     else:
-        V_daily = V_path
+        a = 1.0 - theta_step
+        R_unit, R_known = lfilter([1.0], [1.0, -a], unit), lfilter([1.0], [1.0, -a], known)
 
-    return prices_daily, L_daily, V_daily
+    days = np.arange(n_days)
+    n_carry = np.clip(carry - days * S, 0, S)               # running-in steps in each day
+    V_known = V_step.reshape(n_days, S).sum(axis=1)
+    V_last = Vs[-1] if Vs else None
+    return R_unit[S-1::S], R_known[S-1::S], n_carry, V_known, V_last
+
+
+def iter_regime_mixture_parallel(sigma0, mu=0.0, n_days=5_000_000, samples_per_day=4,
+                                 mean_regime_length_days=None, max_window_days=None,
+                                 mean_reversion_rate=0.001, seed=None,
+                                 block_days=50_000, workers=None):
+    """
+    Yield (log_prices_daily, V_daily) block by block, simulating the blocks on
+    a process pool; see simulate_regime_mixture_parallel. The first block's
+    log-prices start with the initial value 0, later ones do not. At most
+    2 * workers blocks are simulated ahead of the consumer, so memory stays
+    bounded when windowing or scoring the blocks is slower than simulating them.
+    `seed` may also be a SeedSequence or a numpy Generator.
+    """
+    S = samples_per_day
+    dt_step = 1.0 / (252.0 * S)
+    p_switch = switch_probability(S, mean_regime_length_days, max_window_days)
+    theta_step = mean_reversion_rate * dt_step
+    sizes = [min(block_days, n_days - b) for b in range(0, n_days, block_days)]
+    seeds = np.random.default_rng(seed).spawn(len(sizes))   # one stream per block, whatever the workers
+    jobs = [(seeds[k], k == 0, n, S, p_switch, 3/2, sigma0**2, dt_step, mu * dt_step, theta_step)
+            for k, n in enumerate(sizes)]
+
+    pool = ProcessPoolExecutor(workers) if workers is None or workers > 1 else None
+    try:
+        if pool is None:
+            blocks = map(_regime_block, jobs)
+        else:
+            blocks = _in_order(pool, _regime_block, jobs, 2 * (workers or os.cpu_count() or 1))
+        L, V = 0.0, None
+        for n, (R_unit, R_known, n_carry, V_known, V_last) in zip(sizes, blocks):
+            decay = (1.0 - theta_step) ** (S * np.arange(1, n + 1))
+            L_daily = decay * L + R_known
+            V_daily = V_known / S
+            if V is not None:
+                L_daily += np.sqrt(V) * R_unit
+                V_daily += n_carry * V / S
+            yield (np.concatenate([[0.0], L_daily]) if V is None else L_daily), V_daily
+            L = L_daily[-1]
+            V = V if V_last is None else V_last
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def _in_order(pool, fn, jobs, ahead):
+    """
+    pool.map(fn, jobs) with at most `ahead` jobs submitted and not yet
+    consumed, so finished results do not pile up in front of a slow consumer.
+    """
+    jobs = iter(jobs)
+    pending = deque(pool.submit(fn, job) for job in itertools.islice(jobs, ahead))
+    while pending:
+        result = pending.popleft().result()
+        pending.extend(pool.submit(fn, job) for job in itertools.islice(jobs, 1))   # keep the workers busy
+        yield result
+
+
+def simulate_regime_mixture_parallel(sigma0, mu=0.0, n_days=5_000_000, samples_per_day=4,
+                                     mean_regime_length_days=None, max_window_days=None,
+                                     mean_reversion_rate=0.001, seed=None,
+                                     block_days=50_000, workers=None):
+    """
+    The regime mixture model of `simulate_regime_mixture_qvar`, simulated in
+    blocks of `block_days` days on `workers` processes (None: all cores,
+    1: in this process).
+
+    Every block draws from its own SeedSequence child of `seed`, and only the
+    running-in regime's variance and the log-price are carried from block to
+    block, so the path depends on seed and block_days but not on the number
+    of workers. It is a different draw from simulate_regime_mixture_qvar's
+    for the same seed. Returns prices_daily, log_prices_daily and V_daily as
+    that function does.
+    """
+    chunks = list(iter_regime_mixture_parallel(sigma0, mu, n_days, samples_per_day, mean_regime_length_days,
+                                               max_window_days, mean_reversion_rate, seed, block_days, workers))
+    L_daily = np.concatenate([c[0] for c in chunks])
+    V_daily = np.concatenate([c[1] for c in chunks])
+    return np.exp(L_daily), L_daily, V_daily
 
 
 def simulate_price_path(sigma_f, sigma_n, mu=0.0, S0=100.0, dt=1/252, n_steps=50000, seed=None):